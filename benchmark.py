@@ -0,0 +1,641 @@
+"""
+性能測定
+
+python benchmark.py import で import 時間が予算内か確認する
+python benchmark.py check で文字幅の数え方・テーブルの並べ替え・配置指定・差分描画が期待どおりか確認する
+python benchmark.py run -o result.json で各処理を測定し JSON に保存する
+(端末は不要。サイズは --size で指定した仮の値を使う)
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tracemalloc
+
+# terminalDraw の import 時間の予算(ミリ秒)
+# 枠を1つ描いて終わるだけのコマンドでも起動が遅くならないようにする
+IMPORT_BUDGET_MS: Dict[str, float] = {
+    "terminalDraw": 75.0,
+    "romaji": 40.0,
+}
+
+_IMPORT_CODE = """
+from time import perf_counter
+t = perf_counter()
+import {module}
+print((perf_counter() - t) * 1000)
+"""
+
+
+def importTime(module: str, repeat: int = 5) -> float:
+    """
+    新しいプロセスで module を import する時間(ミリ秒, repeat 回の最小値)
+
+    実際の起動と同じくバイトコードキャッシュがある状態で測る
+    (キャッシュは一時ディレクトリに作るのでソースの横は汚さない)
+    """
+    times: List[float] = []
+    with TemporaryDirectory() as cache:
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        env["PYTHONPYCACHEPREFIX"] = cache
+        # 1回目はキャッシュ作成なので捨てる
+        for _ in range(repeat + 1):
+            out = subprocess.run(
+                [sys.executable, "-c", _IMPORT_CODE.format(module=module)],
+                check=True, capture_output=True, text=True, env=env,
+            ).stdout
+            times.append(float(out))
+    return min(times[1:])
+
+
+def checkImportBudget(repeat: int = 5) -> bool:
+    """
+    全モジュールの import 時間を測定して表示し、予算内か返す
+    """
+    ok = True
+    for module, budget in IMPORT_BUDGET_MS.items():
+        ms = importTime(module, repeat)
+        over = ms > budget
+        ok = ok and not over
+        print(f"{module:<16} {ms:8.2f} ms / {budget:.0f} ms{'  OVER' if over else ''}")
+    return ok
+
+
+# 測定対象の文字列を作る乱数の種(結果を再現できるように固定)
+SEED = 20240601
+
+_KEY_DICT = {"ENTER": "\r", "BACKSPACE": "\x7f", "DELETE": "\x04", "TAB": "\t", "LEFT": "\033[D", "RIGHT": "\033[C"}
+
+_ASCII = "abcdefghijklmnopqrstuvwxyz0123456789 ,.-"
+_CJK = "日本語漢字表示幅計算全角文字列あいうえおかきくけこアイウエオカキクケコ"
+_ROMAJI = ["ka", "ki", "ku", "ke", "ko", "sha", "shi", "chu", "tte", "nn", "kya", "ryo", "a", "i", "u", "e", "o", "-", "n"]
+
+
+@dataclass
+class Case:
+    """
+    測定項目
+
+    run() を1回呼ぶと ops 回分の処理をし、出力したバイト数を返す
+    setup() は測定の前に毎回呼ばれる(キャッシュの破棄等)
+    """
+    name: str
+    run: Callable[[], int]
+    ops: int
+    setup: Optional[Callable[[], None]] = None
+
+
+class _Sink:
+    """
+    出力先の代わり(書き込まれたバイト数だけ数える)
+    """
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.frames = 0
+
+    def write(self, s: str) -> None:
+        self.bytes += len(s.encode())
+        self.frames += 1
+
+
+def _texts(chars: str, n: int, length: int, rnd: random.Random) -> List[str]:
+    return ["".join(rnd.choice(chars) for _ in range(length)) for _ in range(n)]
+
+
+def _store(sink: _Sink) -> Any:
+    """
+    出力を sink に向けた DrawObjStore
+    """
+    import terminalDraw as td
+
+    store = td.DrawObjStore(dict(_KEY_DICT))
+    store._write = sink.write  # type: ignore[method-assign]
+    return store
+
+
+def _benchDrawLayers(layers: int, objs: int, full: bool) -> Case:
+    """
+    多数のレイヤー・オブジェクトの描画(1回ごとに1オブジェクトの文字を変える)
+    """
+    import terminalDraw as td
+
+    sink = _Sink()
+    store = _store(sink)
+    texts: List[Any] = []
+    for l in range(layers):
+        store.addLayer()
+        for i in range(objs):
+            x = 1 + (i * 7 + l * 3) % 70
+            y = 1 + (i * 3 + l) % 20
+            if i % 2:
+                store.addObj(td.DrawSquare(x, y, 8, 3))
+            else:
+                t = td.DrawText(x, y, 10, 1, text=f"L{l}O{i}")
+                store.addObj(t)
+                texts.append(t)
+    store.drawTerminal(True)
+    ops = 200
+
+    def run() -> int:
+        before = sink.bytes
+        for k in range(ops):
+            texts[k % len(texts)].changeText(f"#{k}")
+            store.drawTerminal(full)
+        return sink.bytes - before
+
+    return Case(f"drawTerminal/{layers}x{objs}{'/full' if full else ''}", run, ops)
+
+
+def _benchTable(rows: int) -> Case:
+    """
+    テーブルのスクロールと描画
+    """
+    import terminalDraw as td
+    from frameBuffer import FrameBuffer
+
+    rnd = random.Random(SEED)
+    data = [[i, rnd.choice(_CJK) * 3, rnd.randint(0, 10**6)] for i in range(rows)]
+    table = td.DrawTableText(1, 1, 60, 30, data, [[8, "r"], [10, "l"], [10, "r"]])
+    tsd = td._tsDict()
+    tsd.renewal()
+    fb = FrameBuffer(tsd.column, tsd.line)
+    ops = 500
+
+    def run() -> int:
+        n = 0
+        for k in range(ops):
+            table.listScroll(37 if (k // 50) % 2 == 0 else -37)
+            fb.clear()
+            table.draw(tsd, fb)
+            n += len(fb.render().encode())
+        return n
+
+    return Case(f"DrawTableText.draw/{rows}", run, ops)
+
+
+def _benchWidth(kind: str, func: str) -> Case:
+    """
+    文字列幅の計算(毎回キャッシュを捨てる)
+    """
+    import eastAsianWidthOverride as ewo
+
+    rnd = random.Random(SEED)
+    chars = {"ascii": _ASCII, "cjk": _CJK, "mixed": _ASCII + _CJK}[kind]
+    texts = _texts(chars, 5000, 40, rnd)
+    if func == "slen":
+        f: Callable[[str], Any] = ewo.slen
+    else:
+        def f(t: str) -> Any:
+            return ewo.center(t, 80)
+
+    def run() -> int:
+        for t in texts:
+            f(t)
+        return 0
+
+    return Case(f"ewo.{func}/{kind}", run, len(texts), ewo._slenCached.cache_clear)
+
+
+def _benchTyping(jpMode: int) -> Case:
+    """
+    addStrObj による1文字ずつの入力と確定
+    """
+    import terminalDraw as td
+
+    sink = _Sink()
+    store = _store(sink)
+    store.addLayer()
+    obj = td.DrawText(1, 1, 80, 1)
+    obj.jpMode = jpMode
+    store.addObj(obj)
+    rnd = random.Random(SEED)
+    keys = list("".join(rnd.choice(_ROMAJI) for _ in range(100)))
+    ops = len(keys)
+
+    def run() -> int:
+        before = sink.bytes
+        for c in keys:
+            store.addStrObj(c)
+            store.drawTerminal()
+        store.addStrObj(_KEY_DICT["DELETE"])
+        store.drawTerminal()
+        return sink.bytes - before
+
+    return Case(f"addStrObj/jpMode{jpMode}", run, ops)
+
+
+def _benchPaste() -> Case:
+    """
+    pasteStrObj による一括入力
+    """
+    import terminalDraw as td
+
+    sink = _Sink()
+    store = _store(sink)
+    store.addLayer()
+    store.addObj(td.DrawText(1, 1, 80, 1))
+    text = "".join(_texts(_ASCII, 1, 10000, random.Random(SEED)))
+    ops = 20
+
+    def run() -> int:
+        before = sink.bytes
+        for _ in range(ops):
+            store.pasteStrObj(text, maxLen=70)
+            store.drawTerminal()
+            store.addStrObj(_KEY_DICT["DELETE"])
+            store.drawTerminal()
+        return sink.bytes - before
+
+    return Case("pasteStrObj/10k", run, ops)
+
+
+def _benchRomaji(func: str) -> Case:
+    """
+    ローマ字・かな変換(大きな文章)
+    """
+    from romaji import Romaji
+
+    rnd = random.Random(SEED)
+    romaji = ["".join(rnd.choice(_ROMAJI) for _ in range(20)) for _ in range(2000)]
+    Romaji._ensureInit()
+    if func == "Romaji2Hira":
+        texts = romaji
+        f = Romaji.Romaji2Hira
+    else:
+        texts = [Romaji.Romaji2Kata(t) for t in romaji]
+        f = Romaji.kana2Romaji
+
+    def run() -> int:
+        for t in texts:
+            f(t)
+        return 0
+
+    return Case(f"Romaji.{func}", run, len(texts))
+
+
+def cases() -> List[Callable[[], Case]]:
+    """
+    測定項目一覧(作成は測定直前に行う)
+    """
+    return [
+        lambda: _benchDrawLayers(10, 20, False),
+        lambda: _benchDrawLayers(10, 20, True),
+        lambda: _benchTable(1000),
+        lambda: _benchTable(100000),
+        *[lambda k=k, f=f: _benchWidth(k, f) for f in ("slen", "center") for k in ("ascii", "cjk", "mixed")],
+        lambda: _benchTyping(0),
+        lambda: _benchTyping(1),
+        _benchPaste,
+        lambda: _benchRomaji("Romaji2Hira"),
+        lambda: _benchRomaji("kana2Romaji"),
+    ]
+
+
+def measure(case: Case, repeat: int = 5) -> Dict[str, Any]:
+    """
+    1項目測定
+
+    時間は repeat 回の最小値、メモリは別の1回で tracemalloc により測る
+    """
+    times: List[float] = []
+    out = 0
+    for _ in range(repeat):
+        if case.setup != None:
+            case.setup()
+        gc.collect()
+        t = perf_counter()
+        out = case.run()
+        times.append(perf_counter() - t)
+
+    if case.setup != None:
+        case.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops": case.ops,
+        "usPerOp": min(times) / case.ops * 1e6,
+        "usPerOpMedian": sorted(times)[len(times)//2] / case.ops * 1e6,
+        "bytesPerOp": out / case.ops,
+        "peakKiB": peak / 1024,
+    }
+
+
+def runSuite(repeat: int = 5, match: str = "", size: Tuple[int, int] = (120, 40)) -> Dict[str, Any]:
+    """
+    全項目測定(端末サイズは size に固定する)
+    """
+    os.environ["COLUMNS"] = str(size[0])
+    os.environ["LINES"] = str(size[1])
+    results: Dict[str, Dict[str, Any]] = {}
+    for make in cases():
+        case = make()
+        if match not in case.name:
+            continue
+        results[case.name] = r = measure(case, repeat)
+        print(f"{case.name:<32} {r['usPerOp']:10.2f} us/op {r['bytesPerOp']:10.1f} B/op {r['peakKiB']:10.1f} KiB", flush=True)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "size": list(size),
+        "results": results,
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """
+    前回の結果と比較して表示
+    """
+    for name, r in new["results"].items():
+        o = old["results"].get(name)
+        if o is None:
+            continue
+        ratio = r["usPerOp"] / o["usPerOp"] if o["usPerOp"] else float("inf")
+        print(f"{name:<32} {o['usPerOp']:10.2f} -> {r['usPerOp']:10.2f} us/op  x{ratio:.2f}")
+
+
+# 文字幅の確認に使う文字列(結合文字・ゼロ幅接合子・異体字セレクタ・エスケープシーケンスを含む)
+_WIDTH_SAMPLES = [
+    "abc", "日本語", "ｱｲｳ", "😀ok", "👨\u200d👩\u200d👧", "a\u200db", "e\u0301", "か\u3099", "❤\ufe0f", "☺\ufe0e",
+    "\033[31m赤\033[0m", "한국어", "Ω≠", "\u200b", "x\u20e3",
+]
+
+
+def checkWidths(samples: Sequence[str] = _WIDTH_SAMPLES) -> int:
+    """
+    文字幅の数え方がフレームバッファと一致するか確認(一致しなかった文字列の数を返す)
+
+    slen(), offsets() の幅と、putText() で書いたセルの幅の合計を比べる
+    """
+    import eastAsianWidthOverride as ewo
+    from frameBuffer import FrameBuffer
+
+    bad = 0
+    for text in samples:
+        fb = FrameBuffer(40, 1)
+        written = fb.putText(1, 1, text)
+        cells = sum(fb.back.widths[0][:written])
+        widths = (ewo.slen(text), ewo.offsets(text)[-1], written, cells)
+        if len(set(widths)) != 1:
+            bad += 1
+            print(f"{text!r}: slen {widths[0]} offsets {widths[1]} putText {widths[2]} セル {widths[3]}")
+    return bad
+
+
+def checkTableSources(rows: int = 1000) -> int:
+    """
+    取得元の種類によらず、DrawTableText の並べ替え・絞り込みが全行に対して行われるか確認
+    (一致しなかった取得元の数を返す)
+
+    一度描画して先読みが途中の状態から sortBy(), filterBy() する
+    """
+    import terminalDraw as td
+    from rowSource import CallableSource, IteratorSource
+    from terminalBackend import VirtualScreen
+
+    data = [[str(i), str(i % 7)] for i in range(rows)]
+    sources: Dict[str, Callable[[], Any]] = {
+        "list": lambda: [list(r) for r in data],
+        "IteratorSource": lambda: IteratorSource(iter([list(r) for r in data])),
+        "CallableSource": lambda: CallableSource(lambda a, b: data[a:b], len(data)),
+    }
+    expectSorted = sorted(data, key=lambda r: -int(r[0]))
+    expectFiltered = [r for r in expectSorted if r[1] == "3"]
+    bad = 0
+    for name, make in sources.items():
+        store = td.DrawObjStore(dict(_KEY_DICT), VirtualScreen(40, 12))
+        store.addLayer()
+        table = td.DrawTableText(1, 1, 20, 10, make(), [[6, "r"], [3, "r"]])
+        store.addObj(table)
+        store.drawTerminal()
+        table.sortBy(lambda r: -int(r[0]))
+        got = [list(r) for r in table.source.rows(0, len(table.source))]
+        table.filterBy(lambda r: r[1] == "3")
+        gotFiltered = [list(r) for r in table.source.rows(0, len(table.source))]
+        store.drawTerminal()
+        top = store.backend.lines()[0].split()
+        if got != expectSorted or gotFiltered != expectFiltered or top != expectFiltered[0]:
+            bad += 1
+            print(f"{name}: 並べ替え {len(got)} 行, 絞り込み {len(gotFiltered)} 行, 先頭 {top}")
+    return bad
+
+
+def checkLayout() -> int:
+    """
+    Box.set() で配置指定・親の配置指定・親のオブジェクトを変えた時に、差分描画で動くか確認
+    (正しく動かなかった操作の数を返す)
+    """
+    import terminalDraw as td
+    from layout import Box
+    from terminalBackend import VirtualScreen
+
+    screen = VirtualScreen(40, 10)
+    store = td.DrawObjStore(dict(_KEY_DICT), screen)
+    store.addLayer()
+    parent = Box(left=2, top=1, width=20, height=6)
+    square = td.DrawSquare()
+    square.setLayout(parent)
+    a = td.DrawText(text="A")
+    a.setLayout(Box(left=1, top=1, width=1, height=1, parent=parent))
+    b = td.DrawText(text="B")
+    b.setLayout(Box(left=2, top=2, width=1, height=1, parent=square))
+    for d in (square, a, b):
+        store.addObj(d)
+    store.drawTerminal()
+
+    def where(c: str) -> Optional[Tuple[int, int]]:
+        for y, l in enumerate(screen.lines(), 1):
+            if c in l:
+                return (l.index(c) + 1, y)
+        return None
+
+    bad = 0
+    for name, change, expect in [
+        ("a.layout.set", lambda: a.layout.set(left=5), {"A": (8, 3), "B": (5, 4)}),
+        ("parent.set", lambda: parent.set(left=15), {"A": (21, 3), "B": (18, 4)}),
+        ("square.setLayout", lambda: square.setLayout(Box(left=0, top=3, width=10, height=5)), {"A": (21, 3), "B": (3, 6)}),
+    ]:
+        change()
+        changed = store.hasChange()
+        store.drawTerminal()
+        got = {c: where(c) for c in expect}
+        hit = {c: store.objectAt(*p) for c, p in expect.items()}
+        if not changed or got != expect or hit != {"A": a, "B": b}:
+            bad += 1
+            print(f"{name}: 変更通知 {changed}, 位置 {got} (期待 {expect})")
+    return bad
+
+
+def checkConsistency(frames: int = 400, seed: int = SEED, size: Tuple[int, int] = (60, 20), every: int = 5) -> int:
+    """
+    差分描画の結果が全体再描画と一致するか確認(一致しなかった回数を返す)
+
+    画面外にはみ出す位置・大きさ 0 等も含めて、オブジェクトの追加・変更・レイヤー・配置指定の操作をランダムに行い、
+    drawTerminal() で差分描画を続ける
+    every フレームごとにその画面と renderFrame(True) の画面を比べる
+    (全体再描画は位置・整形のキャッシュを作り直すので、毎フレーム比べるとキャッシュの更新漏れが見えなくなる)
+    """
+    import terminalDraw as td
+    from layout import Box
+    from terminalBackend import VirtualScreen
+
+    rnd = random.Random(seed)
+    column, line = size
+    screen = VirtualScreen(column, line)
+    store = td.DrawObjStore(dict(_KEY_DICT), screen)
+    store.sleepTime = 0
+    words = ["abc", "日本語", "hello world", "ｱｲｳ", "x"*30, "\033[31mred\033[0m", "😀ok"]
+
+    def rows() -> List[List[str]]:
+        return [[rnd.choice(words), str(i)] for i in range(rnd.randint(0, 40))]
+
+    boxes: List[Any] = []
+
+    def box(parent: Any) -> Any:
+        return Box(left=rnd.randint(-2, 20), top=rnd.randint(-2, 8), width=rnd.choice([rnd.randint(0, 30), "50%", None]),
+                   height=rnd.randint(0, 6), parent=parent)
+
+    def make() -> Any:
+        x, y = rnd.randint(-2, column), rnd.randint(-2, line)
+        kind = rnd.randrange(5)
+        if kind == 4:
+            # 配置指定(親は Box・配置済みのオブジェクト・端末全体のどれか)
+            d = td.DrawSquare() if rnd.random() < 0.3 else td.DrawText(text=rnd.choice(words))
+            parents = [None] + boxes[-5:] + objs[-5:]
+            d.setLayout(box(rnd.choice(parents)))
+            boxes.append(d.layout)
+            return d
+        if kind == 0:
+            return td.DrawSquare(x, y, rnd.randint(0, 20), rnd.randint(0, 8))
+        if kind == 1:
+            d = td.DrawText(x, y, rnd.randint(0, 20), rnd.randint(0, 5), "\n".join(rnd.choice(words) for _ in range(rnd.randint(1, 4))))
+            d.setOverflow(rnd.choice(td.DrawText.OVERFLOW_MODES))
+            return d
+        if kind == 2:
+            return td.DrawTableText(x, y, rnd.randint(0, 30), rnd.randint(0, 6), rows(), [[8, "c"], [4, "r"]])
+        return td.DrawLogText(x, y, rnd.randint(0, column), rnd.randint(0, 6), capacity=20)
+
+    objs: List[Any] = []
+    store.addLayer()
+    bad = 0
+    for frame in range(frames):
+        r = rnd.random()
+        if r < 0.15 or not objs:
+            if rnd.random() < 0.2:
+                store.addLayer(rnd.random() < 0.1)
+            objs.append(make())
+            store.addObj(objs[-1])
+        elif r < 0.25 and store.layerLen > 1:
+            store.removeLayer()
+            objs = [d for d in objs if d._layerRef is not None]
+        elif r < 0.4 and boxes:
+            # 配置指定の変更(子の Box・親にしているオブジェクトにも伝わる)
+            b = rnd.choice(boxes)
+            if rnd.random() < 0.5:
+                b.set(left=rnd.randint(-2, 20), top=rnd.randint(-2, 8))
+            else:
+                b.set(width=rnd.randint(0, 30), height=rnd.randint(0, 6))
+        else:
+            d = rnd.choice(objs)
+            if isinstance(d, td.DrawTableText):
+                if rnd.random() < 0.5:
+                    d.listScroll(rnd.randint(-5, 5))
+                else:
+                    d.changeListText(rows())
+            elif isinstance(d, td.DrawText):
+                d.changeText(rnd.choice(words) + "\n" + rnd.choice(words))
+            elif isinstance(d, td.DrawLogText):
+                d.extend([rnd.choice(words) + str(frame) for _ in range(rnd.randint(1, 3))])
+            else:
+                d.renewal(x=rnd.randint(-2, column), y=rnd.randint(-2, line))
+        if rnd.random() < 0.05:
+            store.popupDraw("pop\nup")
+        if rnd.random() < 0.03:
+            newSize = (rnd.randint(20, 70), rnd.randint(5, 25))
+            # 同じ大きさへの変更は VirtualScreen が画面を消すだけで、実際の端末では起きない
+            if newSize != (screen.column, screen.line):
+                screen.resize(*newSize)
+
+        store.drawTerminal()
+        if frame % every != every - 1:
+            continue
+        incremental = screen.lines()
+        out = store.renderFrame(True)
+        full = VirtualScreen(screen.column, screen.line)
+        full.feed(out)
+        if full.lines() != incremental or full.styles != screen.styles:
+            bad += 1
+            print(f"frame {frame}: 差分描画と全体再描画が一致しない")
+            for a, b in zip(incremental, full.lines()):
+                if a != b:
+                    print(f"  差分 {a!r}\n  全体 {b!r}")
+        # 以後は全体再描画の画面から続ける
+        screen.reset()
+        screen.feed(out)
+    return bad
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    コマンドライン実行
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="terminalDraw の性能測定")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="import 時間が予算内か確認")
+    p.add_argument("-n", "--repeat", type=int, default=5, help="測定回数")
+    p = sub.add_parser("check", help="文字幅・テーブルの並べ替え・配置指定・差分描画が期待どおりか確認")
+    p.add_argument("-n", "--frames", type=int, default=400, help="フレーム数")
+    p.add_argument("--seed", type=int, default=SEED, help="乱数の種")
+    p = sub.add_parser("run", help="描画・文字幅・ローマ字変換の測定")
+    p.add_argument("-n", "--repeat", type=int, default=5, help="測定回数")
+    p.add_argument("-k", "--match", default="", help="名前にこの文字列を含む項目だけ測定")
+    p.add_argument("-o", "--output", help="結果の保存先(JSON)")
+    p.add_argument("-c", "--compare", help="比較する前回の結果(JSON)")
+    p.add_argument("--size", default="120x40", help="仮の端末サイズ(桁x行)")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        return 0 if checkImportBudget(args.repeat) else 1
+    if args.command == "check":
+        badWidths = checkWidths()
+        print(f"文字幅: {len(_WIDTH_SAMPLES)} 件中 {badWidths} 件不一致")
+        badTables = checkTableSources()
+        print(f"テーブルの並べ替え・絞り込み: {badTables} 件不一致")
+        badLayout = checkLayout()
+        print(f"配置指定の変更: {badLayout} 件不一致")
+        bad = checkConsistency(args.frames, args.seed)
+        print(f"{args.frames} フレーム中 {bad} 回不一致")
+        return 0 if bad == 0 and badWidths == 0 and badTables == 0 and badLayout == 0 else 1
+    if args.command == "run":
+        column, line = (int(v) for v in args.size.split("x"))
+        result = runSuite(args.repeat, args.match, (column, line))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                compare(json.load(f), result)
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
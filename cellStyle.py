@@ -0,0 +1,222 @@
+"""
+セルのスタイル(文字飾り・文字色・背景色)を1つの整数で表す
+
+ビット配置:
+    0~7   文字飾り(BOLD 等)
+    8~33  文字色
+    34~59 背景色
+色は 上位2ビットが種類(0:既定, 1:番号 0~255, 2:RGB)、下位24ビットが値
+"""
+
+from typing import Dict, List, Tuple
+
+# 文字飾り
+BOLD: int = 1
+DIM: int = 2
+ITALIC: int = 4
+UNDERLINE: int = 8
+BLINK: int = 16
+REVERSE: int = 32
+HIDDEN: int = 64
+STRIKE: int = 128
+
+ATTR_MASK: int = 0xFF
+FG_SHIFT: int = 8
+BG_SHIFT: int = 34
+COLOR_MASK: int = (1 << 26) - 1
+
+_INDEXED: int = 1 << 24
+_RGB: int = 2 << 24
+
+# 文字飾りのビット → (付ける SGR, 消す SGR)
+_ATTR_CODES: Tuple[Tuple[int, int, int], ...] = (
+    (BOLD, 1, 22),
+    (DIM, 2, 22),
+    (ITALIC, 3, 23),
+    (UNDERLINE, 4, 24),
+    (BLINK, 5, 25),
+    (REVERSE, 7, 27),
+    (HIDDEN, 8, 28),
+    (STRIKE, 9, 29),
+)
+_ATTR_ON: Dict[int, int] = {on: bit for bit, on, _ in _ATTR_CODES}
+_ATTR_OFF: Dict[int, int] = {}
+for _bit, _, _off in _ATTR_CODES:
+    _ATTR_OFF[_off] = _ATTR_OFF.get(_off, 0) | _bit
+
+
+def indexed(n: int) -> int:
+    """
+    番号指定の色(0~7 は標準色, 8~15 は明るい標準色, 16~255 は 256色)
+    """
+    return _INDEXED | (n & 0xFF)
+
+
+def rgb(r: int, g: int, b: int) -> int:
+    """
+    RGB 指定の色
+    """
+    return _RGB | ((r & 0xFF) << 16) | ((g & 0xFF) << 8) | (b & 0xFF)
+
+
+def fg(color: int) -> int:
+    """
+    文字色のスタイル
+    """
+    return color << FG_SHIFT
+
+
+def bg(color: int) -> int:
+    """
+    背景色のスタイル
+    """
+    return color << BG_SHIFT
+
+
+def combine(base: int, over: int) -> int:
+    """
+    base に over を重ねる(文字飾りは足し、色は over で指定されていれば置き換える)
+    """
+    style = base | (over & ATTR_MASK)
+    for shift in (FG_SHIFT, BG_SHIFT):
+        c = (over >> shift) & COLOR_MASK
+        if c:
+            style = (style & ~(COLOR_MASK << shift)) | (c << shift)
+    return style
+
+
+def _setColor(style: int, shift: int, color: int) -> int:
+    return (style & ~(COLOR_MASK << shift)) | (color << shift)
+
+
+def applySgr(style: int, params: str) -> int:
+    """
+    SGR シーケンスの引数("1;31" 等)を適用したスタイル
+    """
+    if params == "" or params == "0":
+        return 0
+    try:
+        args = [int(p) if p else 0 for p in params.split(";")]
+    except ValueError:
+        return style
+    i = 0
+    n = len(args)
+    while i < n:
+        a = args[i]
+        i += 1
+        if a == 0:
+            style = 0
+        elif a in _ATTR_ON:
+            style |= _ATTR_ON[a]
+        elif a in _ATTR_OFF:
+            style &= ~_ATTR_OFF[a]
+        elif 30 <= a <= 37:
+            style = _setColor(style, FG_SHIFT, indexed(a - 30))
+        elif 90 <= a <= 97:
+            style = _setColor(style, FG_SHIFT, indexed(a - 90 + 8))
+        elif 40 <= a <= 47:
+            style = _setColor(style, BG_SHIFT, indexed(a - 40))
+        elif 100 <= a <= 107:
+            style = _setColor(style, BG_SHIFT, indexed(a - 100 + 8))
+        elif a == 39:
+            style = _setColor(style, FG_SHIFT, 0)
+        elif a == 49:
+            style = _setColor(style, BG_SHIFT, 0)
+        elif a == 38 or a == 48:
+            shift = FG_SHIFT if a == 38 else BG_SHIFT
+            if i < n and args[i] == 5 and i + 1 < n:
+                style = _setColor(style, shift, indexed(args[i+1]))
+                i += 2
+            elif i < n and args[i] == 2 and i + 3 < n:
+                style = _setColor(style, shift, rgb(args[i+1], args[i+2], args[i+3]))
+                i += 4
+            else:
+                break
+    return style
+
+
+def _colorCodes(color: int, isBg: bool) -> List[str]:
+    """
+    色の SGR 引数
+    """
+    kind = color & ~0xFFFFFF
+    value = color & 0xFFFFFF
+    if kind == 0:
+        return ["49" if isBg else "39"]
+    if kind == _INDEXED:
+        if value < 8:
+            return [str((40 if isBg else 30) + value)]
+        if value < 16:
+            return [str((100 if isBg else 90) + value - 8)]
+        return ["48" if isBg else "38", "5", str(value)]
+    return ["48" if isBg else "38", "2", str(value >> 16), str((value >> 8) & 0xFF), str(value & 0xFF)]
+
+
+def _codes(style: int) -> List[str]:
+    """
+    既定の状態から style にする SGR 引数
+    """
+    codes = [str(on) for bit, on, _ in _ATTR_CODES if style & bit]
+    f = (style >> FG_SHIFT) & COLOR_MASK
+    if f:
+        codes += _colorCodes(f, False)
+    b = (style >> BG_SHIFT) & COLOR_MASK
+    if b:
+        codes += _colorCodes(b, True)
+    return codes
+
+
+def sgr(style: int) -> str:
+    """
+    既定の状態から style にする SGR シーケンス
+    """
+    return "\033[" + ";".join(["0"] + _codes(style)) + "m"
+
+
+_transitions: Dict[Tuple[int, int], str] = {}
+
+
+def transition(cur: int, new: int) -> str:
+    """
+    端末のスタイルを cur から new にする最短の SGR シーケンス
+    """
+    if cur == new:
+        return ""
+    key = (cur, new)
+    seq = _transitions.get(key)
+    if seq is not None:
+        return seq
+
+    # 変わった所だけ指定する
+    codes: List[str] = []
+    removed = cur & ~new & ATTR_MASK
+    added = new & ~cur & ATTR_MASK
+    if removed & (BOLD | DIM):
+        # 22 は太字・薄字の両方を消すので、残す方は付け直す
+        codes.append("22")
+        added |= new & (BOLD | DIM)
+        removed &= ~(BOLD | DIM)
+    for bit, on, off in _ATTR_CODES:
+        if removed & bit:
+            codes.append(str(off))
+    for bit, on, off in _ATTR_CODES:
+        if added & bit:
+            codes.append(str(on))
+    for shift, isBg in ((FG_SHIFT, False), (BG_SHIFT, True)):
+        c = (new >> shift) & COLOR_MASK
+        if c != (cur >> shift) & COLOR_MASK:
+            codes += _colorCodes(c, isBg)
+    diff = ";".join(codes)
+
+    # 一度リセットしてから指定する方が短ければそちら
+    full = ";".join(_codes(new))
+    full = "0;" + full if full else "0"
+    if len(full) < len(diff):
+        diff = full
+    if diff == "0":
+        diff = ""
+    seq = "\033[" + diff + "m"
+    if len(_transitions) >= 4096:
+        _transitions.clear()
+    _transitions[key] = seq
+    return seq
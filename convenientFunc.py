@@ -2,7 +2,13 @@
 便利関数
 """
 
-from typing import List, Any
+from typing import Callable, Deque, Iterable, Iterator, List, Any, Optional, TypeVar
+from collections import deque
+from itertools import islice
+from os import cpu_count
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def listFind(l: List[Any], x: Any) -> int:
@@ -13,3 +19,41 @@ def listFind(l: List[Any], x: Any) -> int:
         return l.index(x)
     else:
         return -1
+
+
+def chunked(it: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    size 個ずつのリストに分割
+    """
+    it = iter(it)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def orderedMap(func: Callable[[T], R], it: Iterable[T], processes: Optional[int] = None, prefetch: int = 2) -> Iterator[R]:
+    """
+    プロセスプールで func を並列実行し、入力順に結果を返す
+
+    同時に投入するのは processes*prefetch 個までなので、入力が大きくてもメモリは一定
+    processes=1 ならプールを使わずその場で実行する
+    """
+    if processes == 1:
+        yield from map(func, it)
+        return
+    # multiprocessing の読み込みは重いので使う時まで遅らせる
+    from concurrent.futures import ProcessPoolExecutor
+
+    if processes == None:
+        processes = cpu_count() or 1
+    with ProcessPoolExecutor(processes) as ex:
+        limit = processes * prefetch
+        pending: Deque[Any] = deque()
+        for x in it:
+            pending.append(ex.submit(func, x))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
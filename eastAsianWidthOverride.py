@@ -2,20 +2,208 @@
 lenとかljust,rjust,centerを全角に対応させる
 """
 
-from unicodedata import east_asian_width
+from typing import Dict, Iterable, List, Pattern, Tuple
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from re import compile, DOTALL
+
+from eastAsianWidthTable import WIDE, ZERO
+
+# キャッシュ対象にする文字列の最大長
+_CACHE_LEN = 256
+
+
+def _charClass(ranges: Tuple[Tuple[int, int], ...], bmp: bool) -> str:
+    """
+    範囲テーブルから正規表現(文字クラスの連続)作成
+
+    BMP内だけの文字クラスは高速な表引きになるので、BMP外は別に作る
+    """
+    if bmp:
+        ranges = tuple((a, min(b, 0xFFFF)) for a, b in ranges if a <= 0xFFFF)
+    return "[" + "".join(f"\\U{a:08x}-\\U{b:08x}" for a, b in ranges) + "]+"
+
+
+# 幅2・幅0の文字の正規表現 (BMP外の文字を含むか → パターン)
+# コンパイルに時間がかかるので、必要になった時に作る
+_re_width: Dict[bool, Tuple[Pattern[str], Pattern[str]]] = {}
+_re_astral = compile("[\U00010000-\U0010ffff]")
+# 表示幅を持たないエスケープシーケンス(SGR 等の CSI と、その他の2文字のもの)
+_re_escape = compile("\033(?:\\[[0-?]*[ -/]*[@-~]|.?)", DOTALL)
+
+
+def _widthPatterns(astral: bool) -> Tuple[Pattern[str], Pattern[str]]:
+    """
+    文字幅の正規表現取得(初回のみコンパイル)
+    """
+    p = _re_width.get(astral)
+    if p is None:
+        p = _re_width[astral] = (compile(_charClass(WIDE, not astral)), compile(_charClass(ZERO, not astral)))
+    return p
+
+
+_zeroStart = [a for a, _ in ZERO]
+_zeroEnd = [b for _, b in ZERO]
+_wideStart = [a for a, _ in WIDE]
+_wideEnd = [b for _, b in WIDE]
+
+_charWidth: Dict[str, int] = {}
+
+
+def cwidth(c: str) -> int:
+    """
+    1文字の表示幅取得(0, 1, 2)
+    """
+    w = _charWidth.get(c)
+    if w is None:
+        o = ord(c)
+        i = bisect_right(_zeroStart, o) - 1
+        if i >= 0 and o <= _zeroEnd[i]:
+            w = 0
+        else:
+            i = bisect_right(_wideStart, o) - 1
+            w = 2 if i >= 0 and o <= _wideEnd[i] else 1
+        _charWidth[c] = w
+    return w
+
+
+def _slen(text: str) -> int:
+    """
+    全角半角文字幅取得(キャッシュなし)
+    """
+    if "\033" in text:
+        text = _re_escape.sub("", text)
+    reWide, reZero = _widthPatterns(_re_astral.search(text) != None)
+    # ゼロ幅接合子で繋がれた文字も1文字ずつ数える(フレームバッファのセル・offsets() と同じ数え方)
+    return len(text) + sum(map(len, reWide.findall(text))) - sum(map(len, reZero.findall(text)))
+
+
+_slenCached = lru_cache(maxsize=4096)(_slen)
 
 
 def slen(text: str) -> int:
     """
-    全角半角文字幅取得
+    全角半角文字幅取得(エスケープシーケンスは数えない)
+    """
+    if text.isascii() and "\033" not in text:
+        return len(text)
+    if len(text) <= _CACHE_LEN:
+        return _slenCached(text)
+    return _slen(text)
+
+
+def slens(texts: Iterable[str]) -> List[int]:
+    """
+    複数の文字列の文字幅を一括取得
+    """
+    cached = _slenCached
+    return [len(t) if t.isascii() and "\033" not in t else (cached(t) if len(t) <= _CACHE_LEN else _slen(t)) for t in texts]
+
+
+def cut(s: str, width: int) -> str:
+    """
+    表示幅 width に収まるように末尾を切る(エスケープシーケンスは残す)
     """
+    if "\033" in s:
+        out: List[str] = []
+        pos = 0
+        for m in _re_escape.finditer(s):
+            seg = s[pos:m.start()]
+            part = cut(seg, width)
+            out.append(part)
+            # 途中で切れたら残りの文字は入れない
+            width = width - slen(part) if part == seg else 0
+            out.append(m.group())
+            pos = m.end()
+        out.append(cut(s[pos:], width))
+        return "".join(out)
+    if width <= 0:
+        return ""
+    if s.isascii():
+        return s[:width]
     cou = 0
-    for c in text:
-        if east_asian_width(c) in 'FWA':
-            cou += 2
-        else:
-            cou += 1
-    return cou
+    for i, c in enumerate(s):
+        cou += cwidth(c)
+        if cou > width:
+            return s[:i]
+    return s
+
+
+def stripEscape(s: str) -> str:
+    """
+    エスケープシーケンスを除く
+    """
+    return _re_escape.sub("", s) if "\033" in s else s
+
+
+def offsets(s: str) -> List[int]:
+    """
+    累積の表示幅(offsets(s)[i] が s[:i] の表示幅, エスケープシーケンスは 0)
+
+    1文字ずつの幅の合計で数える(差分更新と同じ数え方)
+    """
+    if s.isascii() and "\033" not in s:
+        return list(range(len(s) + 1))
+    widths = [cwidth(c) for c in s]
+    if "\033" in s:
+        for m in _re_escape.finditer(s):
+            widths[m.start():m.end()] = [0]*(m.end() - m.start())
+    return list(accumulate(widths, initial=0))
+
+
+def cutIndex(offs: List[int], start: int, width: int) -> int:
+    """
+    offsets() の結果から、start 文字目から表示幅 width に収まる終端の位置を二分探索で求める
+    """
+    return bisect_right(offs, offs[start] + width, start) - 1
+
+
+def truncate(s: str, width: int, ellipsis: str = "") -> str:
+    """
+    表示幅 width に収まるように切る(切った時は末尾を ellipsis にする)
+    """
+    if slen(s) <= width:
+        return s
+    if not ellipsis:
+        return cut(s, width)
+    return cut(s, width - slen(ellipsis)) + cut(ellipsis, width)
+
+
+def wrap(s: str, width: int, word: bool = False) -> List[str]:
+    """
+    表示幅 width ごとに折り返す
+
+    word: 空白の位置で折り返す(収まる空白が無ければ途中で切る)
+    1回だけ累積幅を求め、各行の終端は二分探索で探す
+    """
+    if width <= 0:
+        return [s]
+    offs = offsets(s)
+    n = len(s)
+    lines: List[str] = []
+    start = 0
+    while True:
+        end = cutIndex(offs, start, width)
+        if end >= n:
+            lines.append(s[start:])
+            return lines
+        if end == start:
+            # 1文字も収まらない(幅1に全角文字等)
+            end = start + 1
+        nxt = end
+        if word and end < n:
+            if s[end] == " ":
+                nxt = end + 1
+            else:
+                space = s.rfind(" ", start + 1, end)
+                if space > start:
+                    end = space
+                    nxt = space + 1
+        lines.append(s[start:end])
+        start = nxt
+        if start >= n:
+            return lines
 
 
 def _s(s: str, width: int) -> int:
@@ -0,0 +1,238 @@
+"""
+文字入力用の編集バッファ
+"""
+
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import eastAsianWidthOverride as ewo
+
+if TYPE_CHECKING:
+    from romaji import RomajiStream
+
+
+def _width(text: str) -> int:
+    """
+    1文字ずつの幅の合計(差分更新と同じ数え方)
+    """
+    return sum(map(ewo.cwidth, text))
+
+
+class EditBuffer:
+    """
+    編集バッファ(ギャップバッファ)
+
+    確定文字列はカーソル前(_left)とカーソル後(_right, 逆順)の2つのリストで持ち、
+    カーソル位置での追加・削除を O(1) で行う
+    未確定文字列(ローマ字入力中の部分)はカーソル位置に置き、
+    日本語入力モードでは RomajiStream で1文字ずつ変換する
+    """
+
+    def __init__(self, controlText: str = "") -> None:
+        self._left: List[str] = []
+        self._right: List[str] = []
+        self._pending: List[str] = []
+        # 確定文字列・未確定文字列(変換前)の表示幅(None は未計算)
+        self._width: Optional[int] = 0
+        self._pendingWidth: Optional[int] = 0
+        # 変換後の未確定文字列のキャッシュ (jpMode, 文字列, 表示幅)
+        self._converted: Optional[Tuple[int, str, int]] = None
+        self._controlText: Optional[str] = None
+        # 未確定文字列の逐次変換(日本語入力モードで必要になるまで作らない)
+        self._stream: Optional["RomajiStream"] = None
+        # 内容が変わる度に増える
+        self.version = 0
+        self.setControlText(controlText)
+
+    def _changed(self) -> None:
+        self._converted = None
+        self._controlText = None
+        self.version += 1
+
+    def setControlText(self, text: str) -> None:
+        """
+        制御文字列(確定文字列 + "\\u0000" + 未確定文字列)から再構築
+        """
+        committed, _, pending = text.partition("\u0000")
+        self._left = list(committed)
+        self._right = []
+        self._pending = list(pending)
+        # 幅は必要になるまで計算しない
+        self._width = None
+        self._pendingWidth = None
+        self._stream = None
+        self._changed()
+
+    def _widths(self) -> Tuple[int, int]:
+        """
+        確定文字列・未確定文字列(変換前)の表示幅
+        """
+        if self._width is None:
+            self._width = _width("".join(self._left)) + _width("".join(self._right))
+        if self._pendingWidth is None:
+            self._pendingWidth = _width("".join(self._pending))
+        return self._width, self._pendingWidth
+
+    def controlText(self) -> str:
+        """
+        制御文字列取得
+
+        カーソル後の確定文字列は未確定文字列の後ろに付く
+        """
+        if self._controlText is None:
+            self._controlText = "".join(self._left) + "\u0000" + "".join(self._pending) + "".join(reversed(self._right))
+        return self._controlText
+
+    def isEmpty(self) -> bool:
+        """
+        確定・未確定とも空か
+        """
+        return not (self._left or self._right or self._pending)
+
+    def _getStream(self) -> "RomajiStream":
+        """
+        未確定文字列の逐次変換取得
+        """
+        if self._stream is None:
+            # 日本語入力を使うまで romaji は読み込まない
+            from romaji import RomajiStream
+
+            self._stream = RomajiStream(_width)
+            self._stream.push("".join(self._pending))
+        return self._stream
+
+    def _pendingDisplayWidth(self, jpMode: int) -> int:
+        """
+        変換後の未確定文字列の表示幅
+        """
+        if jpMode == 0:
+            return self._widths()[1]
+        return self._getStream().width()
+
+    def _convertedPending(self, jpMode: int) -> Tuple[str, int]:
+        """
+        変換後の未確定文字列と表示幅
+        """
+        c = self._converted
+        if c is None or c[0] != jpMode:
+            if jpMode == 1:
+                text = self._getStream().getHira()
+            elif jpMode == 2:
+                text = self._getStream().getKata()
+            else:
+                text = "".join(self._pending)
+            c = (jpMode, text, self._pendingDisplayWidth(jpMode))
+            self._converted = c
+        return c[1], c[2]
+
+    def getText(self, jpMode: int = 0) -> str:
+        """
+        表示用文字列取得
+        """
+        return "".join(self._left) + self._convertedPending(jpMode)[0] + "".join(reversed(self._right))
+
+    def displayWidth(self, jpMode: int = 0) -> int:
+        """
+        表示幅取得(確定部分は差分更新した値を使う)
+        """
+        return self._widths()[0] + self._pendingDisplayWidth(jpMode)
+
+    def insert(self, text: str, jpMode: int = 0, maxLen: int = 0) -> int:
+        """
+        未確定文字列に一括追加
+
+        maxLen(0で無制限)に達した時点で打ち切り、追加した文字数を返す
+        """
+        if not text:
+            return 0
+        width, pendingWidth = self._widths()
+        if maxLen == 0 or jpMode == 0:
+            if maxLen != 0:
+                # 1文字ずつ入力した場合と同じく、追加前の幅が maxLen 未満なら追加できる
+                cur = width + pendingWidth
+                n = 0
+                for c in text:
+                    if cur >= maxLen:
+                        break
+                    cur += ewo.cwidth(c)
+                    n += 1
+                text = text[:n]
+            if text:
+                self._pending.extend(text)
+                self._pendingWidth = pendingWidth + _width(text)
+                if self._stream != None:
+                    self._stream.push(text)
+                self._changed()
+            return len(text)
+
+        # 日本語入力モードは変換後の幅で判定する
+        stream = self._getStream()
+        n = 0
+        for c in text:
+            if width + stream.width() >= maxLen:
+                break
+            stream.push(c)
+            n += 1
+        if n:
+            self._pending.extend(text[:n])
+            self._pendingWidth = pendingWidth + _width(text[:n])
+            self._changed()
+        return n
+
+    def backspace(self) -> bool:
+        """
+        1文字削除(未確定文字列があればそちらから)
+        """
+        width, pendingWidth = self._widths()
+        if self._pending:
+            self._pendingWidth = pendingWidth - ewo.cwidth(self._pending.pop())
+            if self._stream != None:
+                self._stream.pop()
+        elif self._left:
+            self._width = width - ewo.cwidth(self._left.pop())
+        else:
+            return False
+        self._changed()
+        return True
+
+    def clear(self) -> bool:
+        """
+        全消去
+        """
+        if self.isEmpty():
+            return False
+        self.setControlText("")
+        return True
+
+    def commit(self, jpMode: int = 0) -> None:
+        """
+        未確定文字列を変換して確定
+        """
+        if not self._pending:
+            return
+        text, width = self._convertedPending(jpMode)
+        self._left.extend(text)
+        self._width = self._widths()[0] + width
+        self._pending = []
+        self._pendingWidth = 0
+        self._stream = None
+        self._changed()
+
+    def moveCursor(self, num: int, jpMode: int = 0) -> int:
+        """
+        カーソル移動(未確定文字列は確定してから動かす)
+
+        実際に動いた文字数を返す
+        """
+        self.commit(jpMode)
+        moved = 0
+        if num < 0:
+            while moved > num and self._left:
+                self._right.append(self._left.pop())
+                moved -= 1
+        else:
+            while moved < num and self._right:
+                self._left.append(self._right.pop())
+                moved += 1
+        if moved:
+            self._changed()
+        return moved
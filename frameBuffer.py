@@ -0,0 +1,316 @@
+"""
+セル単位のフレームバッファ(ダブルバッファ)と差分出力
+"""
+
+from typing import List, Optional, Tuple
+
+import eastAsianWidthOverride as ewo
+from cellStyle import applySgr, transition
+
+# 変更セル同士の隙間がこのセル数以下なら、カーソル移動せずに書き直す
+_GAP_MERGE: int = 4
+
+
+class _CellGrid:
+    """
+    セル配列(文字, 幅, スタイル)
+
+    スタイルは cellStyle の整数
+    """
+
+    def __init__(self, column: int, line: int, char: Optional[str] = " ") -> None:
+        self.column = column
+        self.line = line
+        self.chars: List[List[Optional[str]]] = [[char]*column for _ in range(line)]
+        self.widths: List[List[int]] = [[1]*column for _ in range(line)]
+        self.styles: List[List[int]] = [[0]*column for _ in range(line)]
+
+    def fill(self, char: Optional[str]) -> None:
+        """
+        全セルを指定文字で埋める
+        """
+        for y in range(self.line):
+            self.chars[y][:] = [char]*self.column
+            self.widths[y][:] = [1]*self.column
+            self.styles[y][:] = [0]*self.column
+
+
+class FrameBuffer:
+    """
+    フレームバッファ
+
+    back に描画オブジェクトが書き込み、render() で
+    端末に表示済みの front との差分だけを出力文字列にする
+    """
+
+    def __init__(self, column: int = 0, line: int = 0) -> None:
+        self.column = column
+        self.line = line
+        self.back = _CellGrid(column, line)
+        self.front = _CellGrid(column, line)
+        # 書き込み可能な行範囲(1始まり, 両端含む)
+        self.clip: Optional[Tuple[int, int]] = None
+        # 次回 render() で端末側をスクロールさせる範囲 (y0, y1, 行数)
+        self._scrolls: List[Tuple[int, int, int]] = []
+
+    def resize(self, column: int, line: int) -> None:
+        """
+        サイズ変更(端末は消去済みとみなす)
+        """
+        self.column = column
+        self.line = line
+        self.back = _CellGrid(column, line)
+        self.front = _CellGrid(column, line)
+        self._scrolls = []
+
+    def clear(self) -> None:
+        """
+        描画先(back)を空白で埋める
+        """
+        self.back.fill(" ")
+
+    def clearRows(self, y0: int, y1: int) -> None:
+        """
+        描画先(back)の y0~y1 行(1始まり, 両端含む)を空白で埋める
+        """
+        back = self.back
+        for row in range(max(y0, 1)-1, min(y1, self.line)):
+            back.chars[row][:] = [" "]*self.column
+            back.widths[row][:] = [1]*self.column
+            back.styles[row][:] = [0]*self.column
+
+    def setClipRows(self, y0: Optional[int] = None, y1: Optional[int] = None) -> None:
+        """
+        書き込み可能な行範囲を制限(引数省略で解除)
+        """
+        if y0 is None or y1 is None:
+            self.clip = None
+        else:
+            self.clip = (y0, y1)
+
+    def visibleRows(self, y: int, n: int) -> Tuple[int, int]:
+        """
+        y 行目から n 行書く場合に、実際に書き込まれる行の添字範囲 [i0, i1)
+        """
+        y0 = 1
+        y1 = self.line
+        if self.clip is not None:
+            y0 = max(y0, self.clip[0])
+            y1 = min(y1, self.clip[1])
+        i0 = max(y0 - y, 0)
+        i1 = min(y1 - y + 1, n)
+        return i0, max(i0, i1)
+
+    def scrollUp(self, y0: int, y1: int, n: int) -> bool:
+        """
+        y0~y1 行(1始まり, 両端含む, 全幅)の表示済み内容が n 行上に移動したことを通知
+
+        render() で端末側をスクロールさせるので、新しく現れた行だけが差分として出力される
+        スクロールしても得にならない場合は何もせず False を返す
+        """
+        if not (1 <= y0 < y1 <= self.line) or not (0 < n <= y1 - y0) or self.front.chars[y0-1][0] is None:
+            return False
+        self._scrolls.append((y0, y1, n))
+        return True
+
+    def _applyScrolls(self, out: List[str]) -> None:
+        """
+        保留中のスクロールを出力し、front を端末の状態に合わせる
+        """
+        front = self.front
+        for y0, y1, n in self._scrolls:
+            # スクロール領域を設定して上スクロールし、領域を戻す
+            out.append(f"\033[{y0};{y1}r\033[{n}S\033[r")
+            for grid, blank in ((front.chars, " "), (front.widths, 1), (front.styles, 0)):
+                rows = grid[y0-1:y1]
+                grid[y0-1:y1] = rows[n:] + [[blank]*self.column for _ in range(n)]  # type: ignore[list-item]
+        self._scrolls = []
+
+    def invalidate(self) -> None:
+        """
+        表示済み内容(front)を破棄し、次回 render() で全セルを出力させる
+        """
+        self.front.fill(None)
+        self._scrolls = []
+
+    def putText(self, x: int, y: int, text: str, style: int = 0) -> int:
+        """
+        文字列書き込み(座標は1始まり)
+
+        style は cellStyle の整数。文字列中の SGR シーケンスはスタイルとして解釈する
+        (リセットすると style ではなく既定のスタイルに戻る)
+        画面の左右にはみ出す分は書かない(x が 1 未満なら左を切る)
+        戻り値は書き込んだ桁数
+        """
+        row = y - 1
+        if row < 0 or row >= self.line:
+            return 0
+        if self.clip is not None and not (self.clip[0] <= y <= self.clip[1]):
+            return 0
+        column = self.column
+        chars = self.back.chars[row]
+        widths = self.back.widths[row]
+        styles = self.back.styles[row]
+
+        col = x - 1
+        if col >= column:
+            return 0
+
+        if text.isascii() and text.isprintable():
+            # 半角のみ: スライス代入でまとめて書き込む
+            if col < 0:
+                # 1桁目より左の分は書かない
+                text = text[-col:]
+                col = 0
+            end = min(col + len(text), column)
+            k = end - col
+            if k <= 0:
+                return 0
+            if widths[col] == 0 and col > 0:
+                chars[col-1] = " "
+                widths[col-1] = 1
+            if end < column and widths[end] == 0:
+                chars[end] = " "
+                widths[end] = 1
+            chars[col:end] = text[:k]
+            widths[col:end] = [1]*k
+            styles[col:end] = [style]*k
+            return k
+
+        start = max(col, 0)
+        i = 0
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if c == "\033":
+                # エスケープシーケンスはセルにせずスタイルとして解釈
+                if i + 1 < n and text[i+1] == "[":
+                    k = i + 2
+                    while k < n and not ("@" <= text[k] <= "~"):
+                        k += 1
+                    if k < n and text[k] == "m":
+                        style = applySgr(style, text[i+2:k])
+                    i = k + 1
+                else:
+                    i += 2
+                continue
+            i += 1
+            if c < " " or c == "\x7f":
+                continue
+            w = ewo.cwidth(c)
+            if w == 0:
+                # 結合文字等は直前のセルにまとめる
+                p = col - 1
+                if p > 0 and widths[p] == 0:
+                    p -= 1
+                if p >= 0:
+                    chars[p] += c  # type: ignore[operator]
+                continue
+            if col + w > column:
+                break
+            if col < 0:
+                # 1桁目より左の分は書かず、1桁目に掛かる全角文字の右半分は空白にする
+                col += w
+                if col > 0:
+                    chars[0] = " "
+                    widths[0] = 1
+                    styles[0] = style
+                    if column > 1 and widths[1] == 0:
+                        chars[1] = " "
+                        widths[1] = 1
+                continue
+            # 全角文字の片側だけ上書きされる場合は残りを空白にする
+            if widths[col] == 0 and col > 0:
+                chars[col-1] = " "
+                widths[col-1] = 1
+            end = col + w
+            if end < column and widths[end] == 0:
+                chars[end] = " "
+                widths[end] = 1
+            chars[col] = c
+            widths[col] = w
+            styles[col] = style
+            if w == 2:
+                chars[col+1] = ""
+                widths[col+1] = 0
+                styles[col+1] = style
+            col = end
+        return col - start
+
+    def render(self) -> str:
+        """
+        back と front の差分を出力文字列にし、front を更新
+        """
+        out: List[str] = []
+        column = self.column
+        back = self.back
+        front = self.front
+        # カーソル位置(0始まり, 不明なら -1)
+        cx = -1
+        cy = -1
+        curStyle = 0
+
+        if self._scrolls:
+            self._applyScrolls(out)
+
+        for y in range(self.line):
+            bc = back.chars[y]
+            fc = front.chars[y]
+            bs = back.styles[y]
+            fs = front.styles[y]
+            if bc == fc and bs == fs:
+                continue
+            bw = back.widths[y]
+
+            x = 0
+            while x < column:
+                if bc[x] == fc[x] and bs[x] == fs[x]:
+                    x += 1
+                    continue
+
+                # 変更範囲(近い変更はまとめる)
+                start = x
+                last = x
+                j = x + 1
+                while j < column:
+                    if bc[j] != fc[j] or bs[j] != fs[j]:
+                        last = j
+                    elif j - last > _GAP_MERGE:
+                        break
+                    j += 1
+                if bw[start] == 0 and start > 0:
+                    start -= 1
+                end = last + 1
+                while end < column and bw[end] == 0:
+                    end += 1
+
+                # カーソル移動
+                if cy == y and cx < start:
+                    out.append(f"\033[{start-cx}C")
+                elif cy != y or cx != start:
+                    out.append(f"\033[{y+1};{start+1}H")
+
+                for k in range(start, end):
+                    if bw[k] == 0:
+                        continue
+                    s = bs[k]
+                    if s != curStyle:
+                        # 今の状態から変わる所だけ出力する
+                        out.append(transition(curStyle, s))
+                        curStyle = s
+                    out.append(bc[k])  # type: ignore[arg-type]
+
+                fc[start:end] = bc[start:end]
+                fs[start:end] = bs[start:end]
+                front.widths[y][start:end] = bw[start:end]
+
+                cx = end
+                cy = y
+                if end >= column:
+                    # 行末は折り返し保留状態になり得るので位置不明扱い
+                    cy = -1
+                x = end
+
+        if curStyle:
+            out.append("\033[0m")
+        return "".join(out)
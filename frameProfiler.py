@@ -0,0 +1,237 @@
+"""
+フレーム描画の計測
+
+store = DrawObjStore(...)
+prof = FrameProfiler().attach(store, overlay=True)
+で、フレームごとの時間・出力量・オブジェクトごとの draw() 時間を記録する
+attach() しなければ DrawObjStore 側の負担は None の判定だけ
+"""
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+
+from frameBuffer import FrameBuffer
+import eastAsianWidthOverride as ewo
+import terminalDraw as td
+
+
+def objLabel(d: Any) -> str:
+    """
+    描画オブジェクトの表示名(profileName 属性があればそれを使う)
+    """
+    name = getattr(d, "profileName", None)
+    if name:
+        return str(name)
+    return f"{type(d).__name__}@{d.posX},{d.posY}"
+
+
+@dataclass
+class FrameStats:
+    """
+    1フレームの計測結果
+    """
+    # 通し番号
+    index: int
+    # 開始時刻(monotonic)
+    time: float
+    # renderFrame() にかかった秒数(書き込みは含まない)
+    wallTime: float = 0.0
+    # 出力のバイト数
+    bytes: int = 0
+    # 全体を描き直したか
+    full: bool = False
+    # 端末サイズが変わったか
+    resized: bool = False
+    # draw() を呼んだオブジェクト数と、呼ばなかったオブジェクト数
+    drawn: int = 0
+    skipped: int = 0
+    # レイヤー番号 → draw() の合計秒数
+    layerTimes: Dict[int, float] = field(default_factory=dict)
+    # オブジェクトの id → [表示名, draw() の合計秒数]
+    objTimes: Dict[int, List[Any]] = field(default_factory=dict)
+
+
+class FrameProfiler:
+    """
+    フレーム計測(直近 window フレームの統計を持つ)
+    """
+
+    def __init__(self, window: int = 120) -> None:
+        self.frames: Deque[FrameStats] = deque(maxlen=window)
+        # フレームごとに呼ばれる関数
+        self.callbacks: List[Callable[[FrameStats], None]] = []
+        # 端末サイズ変更の回数
+        self.resizeCount = 0
+        self._count = 0
+        self._cur: Optional[FrameStats] = None
+        self._start = 0.0
+        self._store: Optional[td.DrawObjStore] = None
+        self._overlayLayer: Optional[List[Any]] = None
+        self._overlayUpdate: Optional[Callable[[FrameStats], None]] = None
+
+    # DrawObjStore から呼ばれる
+
+    def begin(self) -> None:
+        self._cur = FrameStats(self._count, monotonic())
+        self._start = perf_counter()
+
+    def markResize(self) -> None:
+        if self._cur != None:
+            self._cur.resized = True
+        self.resizeCount += 1
+
+    def markFull(self) -> None:
+        if self._cur != None:
+            self._cur.full = True
+
+    def timeDraw(self, d: "td.Draw", layer: int, tsd: Any, fb: FrameBuffer) -> None:
+        """
+        draw() を時間を計って呼ぶ
+        """
+        t = perf_counter()
+        d.draw(tsd, fb)
+        dt = perf_counter() - t
+        cur = self._cur
+        if cur is None:
+            return
+        cur.layerTimes[layer] = cur.layerTimes.get(layer, 0.0) + dt
+        ent = cur.objTimes.get(id(d))
+        if ent is None:
+            cur.objTimes[id(d)] = [objLabel(d), dt]
+        else:
+            ent[1] += dt
+
+    def cancel(self) -> None:
+        """
+        描き直すものが無かった
+        """
+        self._cur = None
+
+    def end(self, out: str, objCount: int) -> None:
+        cur = self._cur
+        if cur is None:
+            return
+        self._cur = None
+        cur.wallTime = perf_counter() - self._start
+        cur.bytes = len(out.encode())
+        cur.drawn = len(cur.objTimes)
+        cur.skipped = max(objCount - cur.drawn, 0)
+        self._count += 1
+        self.frames.append(cur)
+        for func in list(self.callbacks):
+            func(cur)
+
+    # 統計
+
+    def addCallback(self, func: Callable[[FrameStats], None]) -> None:
+        """
+        フレームごとの通知先追加
+        """
+        self.callbacks.append(func)
+
+    def fps(self) -> float:
+        """
+        直近のフレームレート
+        """
+        if len(self.frames) < 2:
+            return 0.0
+        span = self.frames[-1].time - self.frames[0].time
+        return (len(self.frames) - 1) / span if span > 0 else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        フレーム時間の q パーセンタイル(秒)
+        """
+        times = sorted(f.wallTime for f in self.frames)
+        if not times:
+            return 0.0
+        return times[min(int(len(times) * q / 100), len(times) - 1)]
+
+    def slowest(self, n: int = 5) -> List[Tuple[str, float, float]]:
+        """
+        draw() の遅いオブジェクト (表示名, 最大秒数, 平均秒数) を最大時間順に n 件
+        """
+        agg: Dict[int, List[Any]] = {}
+        for f in self.frames:
+            for key, (label, dt) in f.objTimes.items():
+                a = agg.get(key)
+                if a is None:
+                    agg[key] = [label, dt, dt, 1]
+                else:
+                    a[0] = label
+                    a[1] = max(a[1], dt)
+                    a[2] += dt
+                    a[3] += 1
+        top = sorted(agg.values(), key=lambda a: a[1], reverse=True)[:n]
+        return [(label, mx, total / cnt) for label, mx, total, cnt in top]
+
+    def slowestLayers(self) -> List[Tuple[int, float]]:
+        """
+        レイヤーごとの draw() 合計秒数(多い順)
+        """
+        agg: Dict[int, float] = {}
+        for f in self.frames:
+            for layer, dt in f.layerTimes.items():
+                agg[layer] = agg.get(layer, 0.0) + dt
+        return sorted(agg.items(), key=lambda a: a[1], reverse=True)
+
+    def summary(self, n: int = 3) -> str:
+        """
+        統計の要約文字列
+        """
+        frames = self.frames
+        avgBytes = sum(f.bytes for f in frames) / len(frames) if frames else 0
+        lines = [f"FPS {self.fps():.1f}  p50 {self.percentile(50)*1000:.1f}ms  p99 {self.percentile(99)*1000:.1f}ms  {avgBytes:.0f}B"]
+        for label, mx, mean in self.slowest(n):
+            lines.append(f"{label} max {mx*1000:.2f}ms avg {mean*1000:.2f}ms")
+        return "\n".join(lines)
+
+    # DrawObjStore への取り付け
+
+    def attach(self, store: "td.DrawObjStore", overlay: bool = False, interval: float = 0.5) -> "FrameProfiler":
+        """
+        store の計測を開始
+
+        overlay: 右上に FPS と遅いオブジェクトを表示するレイヤーを追加
+        interval: 表示の更新間隔(秒)
+        """
+        store.profiler = self
+        self._store = store
+        if overlay:
+            self._addOverlay(store, interval)
+        return self
+
+    def detach(self) -> None:
+        """
+        計測終了(表示レイヤーも外す)
+        """
+        store = self._store
+        if store is None:
+            return
+        store.profiler = None
+        if self._overlayLayer != None:
+            store.removeOverlay(self._overlayLayer)
+        self._overlayLayer = None
+        if self._overlayUpdate in self.callbacks:
+            self.callbacks.remove(self._overlayUpdate)
+        self._overlayUpdate = None
+        self._store = None
+
+    def _addOverlay(self, store: "td.DrawObjStore", interval: float) -> None:
+        width = 48
+        text = td.DrawText(lambda ts: max(ts.column - width + 1, 1), 1, width, 4, text="FPS -")
+        text.profileName = "FrameProfiler"  # type: ignore[attr-defined]
+        # 通常のレイヤーにすると getObj() 等の既定の対象が変わるので、全レイヤーの上に重ねる
+        self._overlayLayer = store.addOverlay([text])
+        last = [0.0]
+
+        def update(stats: FrameStats) -> None:
+            # 表示の更新でも1フレーム描かれるので、間隔を空ける
+            if stats.time - last[0] >= interval:
+                last[0] = stats.time
+                text.changeText("\n".join(ewo.cut(l, width) for l in self.summary().split("\n")))
+
+        self._overlayUpdate = update
+        self.addCallback(update)
@@ -0,0 +1,400 @@
+"""
+1つのプロセスで描画したフレームを複数の閲覧者へ配信する
+
+サーバー側:
+    server = FrameServer(store, 120, 40)
+    await server.serve(path="/tmp/dashboard.sock")  # または host, port
+閲覧側:
+    python frameServer.py /tmp/dashboard.sock  (または host:port)
+
+閲覧側は接続時と端末サイズ変更時に "SIZE 桁数 行数\\n" を送る
+描画は store で1回だけ行い、閲覧者の端末サイズごとに切り取って差分を送る
+同じサイズの閲覧者には同じ出力をそのまま送るので、人数が増えても描画の負荷は変わらない
+"""
+
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from time import monotonic
+import asyncio
+import sys
+
+from frameBuffer import FrameBuffer, _CellGrid
+from terminalBackend import Backend
+from terminalDraw import DrawObjStore
+
+# 送信待ちがこのバイト数を超えた閲覧者は切断する
+MAX_BUFFER: int = 1 << 20
+
+
+class _CanvasBackend(Backend):
+    """
+    固定サイズで描画し、出力は捨てる(配信は FrameServer が行う)
+    """
+
+    def __init__(self, column: int, line: int) -> None:
+        self.column = column
+        self.line = line
+
+    def size(self) -> Optional[Tuple[int, int]]:
+        return (self.column, self.line)
+
+
+class _View:
+    """
+    同じ端末サイズの閲覧者の集まり
+
+    fb.front が閲覧者の端末に表示されている内容
+    """
+
+    def __init__(self, column: int, line: int) -> None:
+        self.fb = FrameBuffer(column, line)
+        self.clients: Set["_Client"] = set()
+        # 接続時に送る全体フレーム(内容が変わるまで使い回す)
+        self._full: Optional[bytes] = None
+
+    def update(self, master: FrameBuffer) -> bytes:
+        """
+        master の内容を切り取って差分を作る
+        """
+        back = self.fb.back
+        column = back.column
+        for y in range(back.line):
+            if y < master.line:
+                mc = master.back.chars[y]
+                mw = master.back.widths[y]
+                ms = master.back.styles[y]
+                k = min(column, master.column)
+                back.chars[y][:k] = mc[:k]
+                back.widths[y][:k] = mw[:k]
+                back.styles[y][:k] = ms[:k]
+                # 右端で切れる全角文字は空白にする
+                if k < master.column and k > 0 and mw[k] == 0:
+                    back.chars[y][k-1] = " "
+                    back.widths[y][k-1] = 1
+                    back.styles[y][k-1] = 0
+                if k < column:
+                    back.chars[y][k:] = [" "]*(column-k)
+                    back.widths[y][k:] = [1]*(column-k)
+                    back.styles[y][k:] = [0]*(column-k)
+            else:
+                back.chars[y][:] = [" "]*column
+                back.widths[y][:] = [1]*column
+                back.styles[y][:] = [0]*column
+        out = self.fb.render()
+        if out:
+            self._full = None
+            out += "\033[1;1H"
+        return out.encode()
+
+    def fullFrame(self) -> bytes:
+        """
+        画面を消してから現在の内容を全て描く出力
+        """
+        if self._full is None:
+            tmp = FrameBuffer(self.fb.column, self.fb.line)
+            tmp.back = self.fb.front
+            tmp.front = _CellGrid(self.fb.column, self.fb.line)
+            self._full = ("\033[0m\033[2J" + tmp.render() + "\033[1;1H").encode()
+        return self._full
+
+
+class _Client:
+    """
+    接続中の閲覧者
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.view: Optional[_View] = None
+        self.closed = False
+
+    def send(self, data: bytes, maxBuffer: int) -> bool:
+        """
+        送信(待たない)。送信待ちが溜まりすぎていたら False
+        """
+        if self.closed:
+            return False
+        self.writer.write(data)
+        transport = self.writer.transport
+        return transport.get_write_buffer_size() <= maxBuffer
+
+    def close(self) -> None:
+        """
+        切断(送信待ちは捨てる)
+        """
+        self.closed = True
+        transport = self.writer.transport
+        if not transport.is_closing():
+            transport.abort()
+
+
+class FrameServer:
+    """
+    フレーム配信サーバー
+    """
+
+    def __init__(self, store: DrawObjStore, column: int = 80, line: int = 24, fps: float = 10, maxBuffer: int = MAX_BUFFER) -> None:
+        """
+        store: 描画する DrawObjStore(出力先はこのサーバーに置き換える)
+        column, line: 描画サイズ(閲覧者の端末はこれを切り取って表示する)
+        fps: 最大フレームレート
+        maxBuffer: 閲覧者ごとの送信待ちの上限(超えたら切断)
+        """
+        self.store = store
+        self.fps = fps
+        self.maxBuffer = maxBuffer
+        store.backend = _CanvasBackend(column, line)
+        store.tsd.sizeFunc = store.backend.size
+        self.views: Dict[Tuple[int, int], _View] = {}
+        self.clients: Set[_Client] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        # 閲覧者ごとの受信タスク
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.defaultSize = (column, line)
+
+        # 描画したフレーム数・切断した閲覧者数
+        self.frameCount = 0
+        self.droppedCount = 0
+
+    def resize(self, column: int, line: int) -> None:
+        """
+        描画サイズ変更
+        """
+        backend = self.store.backend
+        assert isinstance(backend, _CanvasBackend)
+        backend.column = column
+        backend.line = line
+        self.requestFrame()
+
+    def requestFrame(self) -> None:
+        """
+        描画要求(別スレッドからも呼べる)
+        """
+        loop = self._loop
+        if loop is None or self._wake is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake.set()
+        else:
+            loop.call_soon_threadsafe(self._wake.set)
+
+    # 閲覧者
+
+    def _view(self, size: Tuple[int, int]) -> _View:
+        view = self.views.get(size)
+        if view is None:
+            view = self.views[size] = _View(size[0], size[1])
+            view.update(self.store.frameBuffer)
+        return view
+
+    def _setView(self, client: _Client, size: Tuple[int, int]) -> None:
+        """
+        閲覧者の端末サイズを設定し、全体フレームを送る
+        """
+        old = client.view
+        if old != None:
+            old.clients.discard(client)
+            if not old.clients:
+                del self.views[(old.fb.column, old.fb.line)]
+        view = self._view(size)
+        view.clients.add(client)
+        client.view = view
+        if not client.send(view.fullFrame(), self.maxBuffer):
+            self._drop(client)
+
+    def _drop(self, client: _Client) -> None:
+        """
+        閲覧者の切断
+        """
+        if client in self.clients:
+            self.clients.discard(client)
+            self.droppedCount += 1 if not client.closed else 0
+        view = client.view
+        if view != None:
+            view.clients.discard(client)
+            if not view.clients and self.views.get((view.fb.column, view.fb.line)) is view:
+                del self.views[(view.fb.column, view.fb.line)]
+            client.view = None
+        client.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = _Client(reader, writer)
+        task = asyncio.current_task()
+        if task != None:
+            self._tasks.add(task)
+        self.clients.add(client)
+        self._setView(client, self.defaultSize)
+        try:
+            while not client.closed:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.split()
+                if len(parts) == 3 and parts[0] == b"SIZE":
+                    try:
+                        size = (max(int(parts[1]), 1), max(int(parts[2]), 1))
+                    except ValueError:
+                        continue
+                    self._setView(client, size)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # 自分から閉じた場合は切断数に数えない
+            client.closed = True
+            self._drop(client)
+            if task != None:
+                self._tasks.discard(task)
+
+    # 描画
+
+    def _broadcast(self) -> None:
+        """
+        1フレーム描画してサイズごとの差分を送る
+        """
+        master = self.store.frameBuffer
+        if not self.store.renderFrame():
+            return
+        self.frameCount += 1
+        for view in list(self.views.values()):
+            data = view.update(master)
+            if not data:
+                continue
+            for client in list(view.clients):
+                if not client.send(data, self.maxBuffer):
+                    # 遅い閲覧者は切断して他を待たせない
+                    self._drop(client)
+
+    async def _waitWake(self) -> None:
+        """
+        描画要求か、store の次の予約処理の時刻まで待つ
+        """
+        assert self._wake != None
+        timeout = self.store.timerWait()
+        if timeout is None:
+            await self._wake.wait()
+            return
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def serve(self, path: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None) -> None:
+        """
+        配信開始(stop() まで戻らない)
+
+        path を指定すると Unix ソケット、そうでなければ TCP で待ち受ける
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if path != None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        prevHook = self.store.changeHook
+        self.store.changeHook = self.requestFrame
+        self._running = True
+        self._wake.set()
+        last = -float("inf")
+        try:
+            while self._running:
+                await self._waitWake()
+                if not self._running:
+                    break
+                delay = last + 1 / self.fps - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._wake.clear()
+                last = monotonic()
+                self._broadcast()
+        finally:
+            self.store.changeHook = prevHook
+            self._running = False
+            self._server.close()
+            for client in list(self.clients):
+                client.closed = True
+                self._drop(client)
+            # 受信タスクが切断を検知して終わるのを待つ
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._server.wait_closed()
+
+    def sockets(self) -> List[Tuple[str, ...]]:
+        """
+        待ち受け中のアドレス
+        """
+        if self._server is None:
+            return []
+        return [s.getsockname() for s in self._server.sockets]
+
+    def stop(self) -> None:
+        """
+        配信停止
+        """
+        self._running = False
+        self.requestFrame()
+
+
+def view(address: str) -> int:
+    """
+    閲覧(受け取ったフレームを標準出力へ書き、端末サイズを送る)
+    """
+    from shutil import get_terminal_size
+    import os
+    import selectors
+    import signal
+    import socket
+
+    if ":" in address and not os.path.exists(address):
+        host, port = address.rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address)
+
+    def sendSize(*_: object) -> None:
+        ts = get_terminal_size()
+        sock.sendall(f"SIZE {ts.columns} {ts.lines}\n".encode())
+
+    sendSize()
+    if hasattr(signal, "SIGWINCH"):
+        signal.signal(signal.SIGWINCH, sendSize)
+    out = sys.stdout.buffer
+    sel = selectors.DefaultSelector()
+    sel.register(sock, selectors.EVENT_READ)
+    try:
+        while True:
+            for _ in sel.select():
+                data = sock.recv(1 << 16)
+                if not data:
+                    return 0
+                out.write(data)
+                out.flush()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        sock.close()
+        out.write(b"\033[0m\n")
+        out.flush()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    コマンドライン実行
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="FrameServer の配信を閲覧する")
+    parser.add_argument("address", help="Unix ソケットのパス、または host:port")
+    args = parser.parse_args(argv)
+    return view(args.address)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""
+キーボード・マウス入力
+
+reader = InputReader(keyDict)
+with reader:                       # raw モード(終了時に元へ戻す)
+    events = reader.read(0.1)      # 届いている入力をまとめて取得(待つのは最大 0.1 秒)
+    result = dispatchText(store, events)
+asyncio では reader.attach(loop, callback) で届く度に callback(events) が呼ばれる
+
+エスケープシーケンス(矢印・ファンクションキー・SGR マウス・貼り付け)は木構造で照合し、
+途中で途切れた ESC は escTimeout 秒待ってから単独の ESC として扱う
+1回の読み込みで届いた入力は1つのまとまり(リスト)として返すので、
+貼り付けや連打でも描画は1回で済む
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+from dataclasses import dataclass
+from codecs import getincrementaldecoder
+from re import compile
+import os
+import sys
+
+if TYPE_CHECKING:
+    from asyncio import AbstractEventLoop, TimerHandle
+    from terminalDraw import DrawObjStore
+
+PASTE_START: str = "\033[200~"
+PASTE_END: str = "\033[201~"
+
+# SGR マウス / その他の CSI
+_re_mouse = compile(r"\033\[<(\d+);(\d+);(\d+)([Mm])")
+_re_mousePart = compile(r"\033\[<[\d;]*$")
+_re_csi = compile(r"\033\[[0-?]*[ -/]*[@-~]")
+_re_csiPart = compile(r"\033\[[0-?]*[ -/]*$")
+
+
+@dataclass
+class KeyEvent:
+    """
+    キー入力
+    """
+    # キー名("UP", "F1", "CTRL_A", 文字そのもの等)
+    key: str
+    # 入力された文字列(addStrObj() にはこちらを渡す)
+    data: str
+
+
+@dataclass
+class MouseEvent:
+    """
+    マウス入力(座標は1始まり)
+    """
+    x: int
+    y: int
+    # 0:左 1:中 2:右 64:ホイール上 65:ホイール下
+    button: int
+    # "press" / "release" / "drag"
+    action: str
+    # 1:Shift 2:Alt 4:Ctrl
+    mods: int = 0
+
+
+@dataclass
+class PasteEvent:
+    """
+    貼り付け(ブラケットペーストモード)
+    """
+    text: str
+
+
+ta_Event = Union[KeyEvent, MouseEvent, PasteEvent]
+
+
+def _defaultKeys() -> Dict[str, str]:
+    """
+    シーケンス → キー名
+    """
+    keys: Dict[str, str] = {
+        "\r": "ENTER", "\n": "ENTER", "\t": "TAB", "\x7f": "BACKSPACE", "\x08": "BACKSPACE",
+        "\033": "ESC", "\033[Z": "SHIFT_TAB",
+    }
+    for i in range(1, 27):
+        c = chr(i)
+        if c not in keys:
+            keys[c] = "CTRL_" + chr(ord("A") + i - 1)
+    arrows = {"A": "UP", "B": "DOWN", "C": "RIGHT", "D": "LEFT", "H": "HOME", "F": "END"}
+    mods = {"2": "SHIFT_", "3": "ALT_", "5": "CTRL_", "6": "CTRL_SHIFT_"}
+    for c, name in arrows.items():
+        keys["\033[" + c] = name
+        keys["\033O" + c] = name
+        for m, prefix in mods.items():
+            keys[f"\033[1;{m}{c}"] = prefix + name
+    tilde = {"1": "HOME", "2": "INSERT", "3": "DEL", "4": "END", "5": "PAGEUP", "6": "PAGEDOWN", "7": "HOME", "8": "END",
+             "15": "F5", "17": "F6", "18": "F7", "19": "F8", "20": "F9", "21": "F10", "23": "F11", "24": "F12"}
+    for n, name in tilde.items():
+        keys[f"\033[{n}~"] = name
+        for m, prefix in mods.items():
+            keys[f"\033[{n};{m}~"] = prefix + name
+    for c, name in {"P": "F1", "Q": "F2", "R": "F3", "S": "F4"}.items():
+        keys["\033O" + c] = name
+        keys["\033[1" + c] = name
+        for m, prefix in mods.items():
+            keys[f"\033[1;{m}{c}"] = prefix + name
+    return keys
+
+
+class KeyParser:
+    """
+    入力文字列 → 入力イベント
+
+    シーケンスは1文字ずつの木(dict の入れ子, None キーにキー名)で照合し、最長一致を取る
+    途中で途切れたシーケンスは次の feed() まで持ち越す
+    """
+
+    def __init__(self, keyDict: Optional[Dict[str, str]] = None) -> None:
+        """
+        keyDict: キー名 → シーケンス(DrawObjStore の keyDict, 既定の名前より優先)
+        """
+        keys = _defaultKeys()
+        if keyDict != None:
+            for name, seq in keyDict.items():
+                if seq:
+                    keys[seq] = name
+        self._trie: Dict[Any, Any] = {}
+        for seq, name in keys.items():
+            node = self._trie
+            for c in seq:
+                node = node.setdefault(c, {})
+            node[None] = name
+        self._buf = ""
+        # 貼り付け中の文字列(None なら貼り付け中ではない)
+        self._paste: Optional[List[str]] = None
+
+    def pending(self) -> bool:
+        """
+        途中で途切れた入力を持っているか
+        """
+        return self._buf != "" or self._paste != None
+
+    def feed(self, data: str) -> List[ta_Event]:
+        """
+        入力を追加して、確定したイベントを返す
+        """
+        self._buf += data
+        return self._parse(False)
+
+    def flush(self) -> List[ta_Event]:
+        """
+        続きを待たずに、持ち越している入力をイベントにする(ESC の待ち時間切れ)
+        """
+        return self._parse(True)
+
+    def _parse(self, final: bool) -> List[ta_Event]:
+        buf = self._buf
+        n = len(buf)
+        events: List[ta_Event] = []
+        i = 0
+        while i < n:
+            if self._paste != None:
+                end = buf.find(PASTE_END, i)
+                if end < 0:
+                    # 終端の途中かもしれない部分は残す
+                    keep = 0
+                    for k in range(min(len(PASTE_END) - 1, n - i), 0, -1):
+                        if PASTE_END.startswith(buf[n-k:]):
+                            keep = k
+                            break
+                    if final:
+                        keep = 0
+                    self._paste.append(buf[i:n-keep])
+                    i = n - keep
+                    if final:
+                        events.append(PasteEvent("".join(self._paste)))
+                        self._paste = None
+                    break
+                self._paste.append(buf[i:end])
+                events.append(PasteEvent("".join(self._paste)))
+                self._paste = None
+                i = end + len(PASTE_END)
+                continue
+
+            c = buf[i]
+            if c != "\033":
+                # 通常の文字はまとめて処理する
+                j = i
+                trie = self._trie
+                while j < n and buf[j] != "\033":
+                    ch = buf[j]
+                    node = trie.get(ch)
+                    name = node.get(None) if node != None else None
+                    events.append(KeyEvent(name if name != None else ch, ch))
+                    j += 1
+                i = j
+                continue
+
+            rest = buf[i:]
+            if rest.startswith(PASTE_START):
+                self._paste = []
+                i += len(PASTE_START)
+                continue
+            if rest.startswith("\033[<"):
+                m = _re_mouse.match(rest)
+                if m != None:
+                    events.append(_mouseEvent(m))
+                    i += m.end()
+                    continue
+                if _re_mousePart.match(rest) and not final:
+                    break
+
+            # 木で最長一致
+            node = self._trie
+            j = i
+            match: Optional[Tuple[int, str]] = None
+            while j < n:
+                nxt = node.get(buf[j])
+                if nxt is None:
+                    break
+                node = nxt
+                j += 1
+                if None in node:
+                    match = (j, node[None])
+            incomplete = j == n and len(node) > (1 if None in node else 0)
+            if incomplete and not final:
+                # CSI なら終端文字まで待つ、それ以外は続きが来るかもしれないので待つ
+                break
+            if (match is None or match[0] == i + 1) and i + 1 < n and buf[i+1] >= " " and buf[i+1] != "\x7f" and buf[i+1] not in "[O":
+                # ESC + 文字は Alt 付きの入力
+                events.append(KeyEvent("ALT_" + buf[i+1], buf[i:i+2]))
+                i += 2
+                continue
+            csi = _re_csi.match(rest)
+            if csi is None and _re_csiPart.match(rest) and not final:
+                # CSI の終端文字がまだ来ていない
+                break
+            if match != None and (csi is None or csi.end() <= match[0] - i):
+                events.append(KeyEvent(match[1], buf[i:match[0]]))
+                i = match[0]
+                continue
+            if csi != None:
+                # 知らない CSI はシーケンスをそのままキー名にする
+                seq = csi.group(0)
+                events.append(KeyEvent(seq, seq))
+                i += len(seq)
+                continue
+            events.append(KeyEvent("ESC", "\033"))
+            i += 1
+        self._buf = buf[i:]
+        return events
+
+
+def _mouseEvent(m: Any) -> MouseEvent:
+    """
+    SGR マウスのシーケンスからイベント作成
+    """
+    code = int(m.group(1))
+    x = int(m.group(2))
+    y = int(m.group(3))
+    mods = (code >> 2) & 7
+    if m.group(4) == "m":
+        action = "release"
+    elif code & 32:
+        action = "drag"
+    else:
+        action = "press"
+    button = (code & 3) | (code & 64)
+    return MouseEvent(x, y, button, action, mods)
+
+
+class InputReader:
+    """
+    端末からの入力読み込み(待たずに読む)
+    """
+
+    def __init__(self, keyDict: Optional[Dict[str, str]] = None, fd: Optional[int] = None, escTimeout: float = 0.05, mouse: bool = False, paste: bool = True, signals: bool = True) -> None:
+        """
+        keyDict: キー名 → シーケンス
+        fd: 入力のファイル記述子(省略時は標準入力)
+        escTimeout: 途切れた ESC を単独の ESC とみなすまでの秒数
+        mouse: マウス入力(SGR 形式)を受け取る
+        paste: ブラケットペーストモードを使う
+        signals: Ctrl+C 等でシグナルを送る(False ならキーとして受け取る)
+        """
+        self.fd = fd if fd != None else sys.stdin.fileno()
+        self.escTimeout = escTimeout
+        self.mouse = mouse
+        self.paste = paste
+        self.signals = signals
+        self.parser = KeyParser(keyDict)
+        self._decoder = getincrementaldecoder("utf-8")("replace")
+        self._saved: Optional[List[Any]] = None
+        self._loop: Optional["AbstractEventLoop"] = None
+        self._callback: Optional[Callable[[List[ta_Event]], None]] = None
+        self._timer: Optional["TimerHandle"] = None
+
+    # raw モード
+
+    def _modes(self, on: bool) -> str:
+        seq = ""
+        if self.paste:
+            seq += "\033[?2004h" if on else "\033[?2004l"
+        if self.mouse:
+            seq += "\033[?1000h\033[?1002h\033[?1006h" if on else "\033[?1006l\033[?1002l\033[?1000l"
+        return seq
+
+    def start(self) -> None:
+        """
+        raw モードにする(エコー・行単位の入力を止める)
+        """
+        if self._saved != None:
+            return
+        import termios
+
+        try:
+            attrs = termios.tcgetattr(self.fd)
+        except termios.error:
+            # 端末でなければモードは変えない(パイプ等)
+            return
+        self._saved = attrs
+        new = [list(a) if isinstance(a, list) else a for a in attrs]
+        new[0] &= ~(termios.BRKINT | termios.ICRNL | termios.INPCK | termios.ISTRIP | termios.IXON)
+        lflag = termios.ECHO | termios.ICANON | termios.IEXTEN
+        if not self.signals:
+            lflag |= termios.ISIG
+        new[3] &= ~lflag
+        new[6][termios.VMIN] = 1
+        new[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, new)
+        self._writeMode(True)
+
+    def stop(self) -> None:
+        """
+        端末のモードを元に戻す
+        """
+        self.detach()
+        if self._saved is None:
+            return
+        import termios
+
+        self._writeMode(False)
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved)
+        self._saved = None
+
+    def _writeMode(self, on: bool) -> None:
+        seq = self._modes(on)
+        if seq:
+            sys.stdout.write(seq)
+            sys.stdout.flush()
+
+    def __enter__(self) -> "InputReader":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    # 読み込み
+
+    def _readAvailable(self) -> str:
+        """
+        今読める分を全て読む
+        """
+        from select import select
+
+        chunks: List[bytes] = []
+        while True:
+            data = os.read(self.fd, 4096)
+            if not data:
+                break
+            chunks.append(data)
+            if len(data) < 4096 or not select([self.fd], [], [], 0)[0]:
+                break
+        return self._decoder.decode(b"".join(chunks))
+
+    def read(self, timeout: Optional[float] = None) -> List[ta_Event]:
+        """
+        入力をまとめて取得(timeout 秒待っても無ければ空, None なら届くまで待つ)
+        """
+        from select import select
+
+        if not select([self.fd], [], [], timeout)[0]:
+            return self.parser.flush() if self.parser.pending() else []
+        events = self.parser.feed(self._readAvailable())
+        # シーケンスの途中なら続きを少しだけ待つ
+        while self.parser.pending():
+            if not select([self.fd], [], [], self.escTimeout)[0]:
+                events += self.parser.flush()
+                break
+            events += self.parser.feed(self._readAvailable())
+        return events
+
+    # asyncio
+
+    def attach(self, loop: "AbstractEventLoop", callback: Callable[[List[ta_Event]], None]) -> None:
+        """
+        入力が届く度に callback(events) を呼ぶ(ループ内で実行)
+        """
+        self.detach()
+        self._loop = loop
+        self._callback = callback
+        loop.add_reader(self.fd, self._onReadable)
+
+    def detach(self) -> None:
+        """
+        attach() の解除
+        """
+        if self._loop is None:
+            return
+        self._loop.remove_reader(self.fd)
+        if self._timer != None:
+            self._timer.cancel()
+            self._timer = None
+        self._loop = None
+        self._callback = None
+
+    def _deliver(self, events: List[ta_Event]) -> None:
+        if events and self._callback != None:
+            self._callback(events)
+
+    def _onReadable(self) -> None:
+        if self._timer != None:
+            self._timer.cancel()
+            self._timer = None
+        events = self.parser.feed(self._readAvailable())
+        if self.parser.pending() and self._loop != None:
+            self._timer = self._loop.call_later(self.escTimeout, self._onTimeout)
+        self._deliver(events)
+
+    def _onTimeout(self) -> None:
+        self._timer = None
+        self._deliver(self.parser.flush())
+
+
+def dispatchText(store: "DrawObjStore", events: List[ta_Event], allowKeyRegex: str = " -~", maxLen: int = 0, jpChange: bool = False, objInd: Optional[int] = None, layerInd: Optional[int] = None) -> Union[int, str]:
+    """
+    入力イベントを文字入力オブジェクトへ反映(addStrObj() の一括版)
+
+    続けて入力された文字と貼り付けは pasteStrObj() の1回の変更にまとめる
+    ENTER で確定した文字列があればそれを返す(以降のイベントは捨てる)
+    マウス入力は無視する
+    """
+    run: List[str] = []
+
+    def flushRun() -> None:
+        if run:
+            store.pasteStrObj("".join(run), allowKeyRegex, maxLen, objInd, layerInd)
+            run.clear()
+
+    result: Union[int, str] = 0
+    for ev in events:
+        if isinstance(ev, PasteEvent):
+            run.append(ev.text)
+        elif isinstance(ev, KeyEvent):
+            if len(ev.data) == 1 and ev.data >= " " and ev.data != "\x7f" and ev.data not in store.keyDict.values():
+                run.append(ev.data)
+                continue
+            flushRun()
+            # 同じキーでも端末によってシーケンスが違うので、名前が keyDict にあればそちらに揃える
+            result = store.addStrObj(store.keyDict.get(ev.key, ev.data), allowKeyRegex, maxLen, jpChange, objInd, layerInd)
+            if isinstance(result, str):
+                return result
+    flushRun()
+    return result
@@ -0,0 +1,168 @@
+"""
+宣言的な配置指定
+
+d = DrawText(text="...")
+d.setLayout(Box(width="50%", height=5, centerX=True, bottom=1))
+で、端末サイズ(または親の矩形)に対する位置・大きさを指定する
+結果は端末サイズ・指定・親の矩形が変わるまで Box に保持するので、
+毎フレーム位置を計算し直さない
+set() で指定を変えると、この Box と子の Box を使う Draw に再描画を通知する
+
+長さは int(文字数) か "50%" / "50%-2" の様な文字列(親の大きさに対する割合 + 文字数)
+"""
+
+from typing import Any, Optional, Tuple, Union
+from re import compile
+from weakref import WeakSet
+
+ta_Len = Union[int, str, None]
+ta_Rect = Tuple[int, int, int, int]
+
+_re_percent = compile(r"\s*(-?\d+(?:\.\d+)?)%\s*(?:([+-])\s*(\d+))?\s*")
+
+
+def resolveLength(value: ta_Len, total: int) -> int:
+    """
+    長さ指定を文字数にする
+    """
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    m = _re_percent.fullmatch(value)
+    if m is None:
+        raise ValueError(f"長さの指定が不正です: {value!r}")
+    n = int(total * float(m.group(1)) / 100)
+    if m.group(2) != None:
+        n += int(m.group(3)) if m.group(2) == "+" else -int(m.group(3))
+    return n
+
+
+class Box:
+    """
+    配置指定
+
+    left/right/top/bottom: 親の各辺からの距離
+    width/height: 大きさ(省略時は親の大きさから left, right を除いた分, 中央寄せなら親の大きさ)
+    centerX/centerY: 親の中央に置く(left/top はそこからのずらし幅になる)
+    parent: 親(Box か配置済みの Draw, 省略時は端末全体)
+    min*/max*: 大きさの下限・上限
+    """
+
+    def __init__(self, left: ta_Len = None, top: ta_Len = None, right: ta_Len = None, bottom: ta_Len = None,
+                 width: ta_Len = None, height: ta_Len = None, centerX: bool = False, centerY: bool = False,
+                 parent: Any = None, minWidth: int = 0, maxWidth: Optional[int] = None,
+                 minHeight: int = 0, maxHeight: Optional[int] = None) -> None:
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+        self.width = width
+        self.height = height
+        self.centerX = centerX
+        self.centerY = centerY
+        self.parent: Any = None
+        self.minWidth = minWidth
+        self.maxWidth = maxWidth
+        self.minHeight = minHeight
+        self.maxHeight = maxHeight
+        # 指定が変わる度に増える
+        self.version = 0
+        # 前回の計算条件と結果
+        self._key: Optional[Tuple[Any, ...]] = None
+        self._rect: ta_Rect = (1, 1, 0, 0)
+        # この Box を使う Draw と、親にしている Box(変更の通知先)
+        self._owners: "WeakSet[Any]" = WeakSet()
+        self._children: "WeakSet[Box]" = WeakSet()
+        self._setParent(parent)
+
+    def set(self, **kwargs: Any) -> None:
+        """
+        指定変更
+        """
+        for name, value in kwargs.items():
+            if not hasattr(self, name) or name.startswith("_") or name == "version":
+                raise AttributeError(name)
+            if name == "parent":
+                self._setParent(value)
+            else:
+                setattr(self, name, value)
+        self.version += 1
+        self._notify()
+
+    def _setParent(self, parent: Any) -> None:
+        """
+        親の変更(親の変更通知を受け取れるように登録し直す)
+        """
+        old = _childSet(self.parent)
+        if old != None:
+            old.discard(self)
+        self.parent = parent
+        new = _childSet(parent)
+        if new != None:
+            new.add(self)
+
+    def _notify(self) -> None:
+        """
+        この Box と子の Box を使う Draw に再描画を通知
+        """
+        for d in list(self._owners):
+            d.markDirty()
+        for child in list(self._children):
+            child._notify()
+
+    def _parentRect(self, tsd: Any) -> ta_Rect:
+        parent = self.parent
+        if parent is None:
+            return (1, 1, tsd.column, tsd.line)
+        if isinstance(parent, Box):
+            return parent.resolve(tsd)
+        # 配置済みの Draw
+        parent.renewalPos(tsd)
+        return (parent.posX, parent.posY, parent.posSX, parent.posSY)
+
+    def resolve(self, tsd: Any) -> ta_Rect:
+        """
+        矩形(x, y, sx, sy)の計算(条件が前回と同じなら前回の結果)
+        """
+        parent = self._parentRect(tsd)
+        key = (tsd.column, tsd.line, self.version, parent)
+        if key == self._key:
+            return self._rect
+        px, py, pw, ph = parent
+        x, w = _axis(px, pw, self.left, self.right, self.width, self.centerX, self.minWidth, self.maxWidth)
+        y, h = _axis(py, ph, self.top, self.bottom, self.height, self.centerY, self.minHeight, self.maxHeight)
+        self._key = key
+        self._rect = (x, y, w, h)
+        return self._rect
+
+
+def _childSet(parent: Any) -> "Optional[WeakSet[Box]]":
+    """
+    親(Box か Draw)の子の Box の集合
+    """
+    if isinstance(parent, Box):
+        return parent._children
+    return getattr(parent, "_childLayouts", None)
+
+
+def _axis(start: int, total: int, near: ta_Len, far: ta_Len, size: ta_Len, center: bool, minSize: int, maxSize: Optional[int]) -> Tuple[int, int]:
+    """
+    1方向の (位置, 大きさ)
+    """
+    a = resolveLength(near, total)
+    b = resolveLength(far, total)
+    if size != None:
+        n = resolveLength(size, total)
+    elif center:
+        n = total
+    else:
+        n = total - a - b
+    if maxSize != None:
+        n = min(n, maxSize)
+    n = max(n, minSize)
+    if center:
+        return start + total // 2 - n // 2 + a, n
+    if near is None and far != None:
+        return start + total - b - n, n
+    return start + a, n
@@ -0,0 +1,127 @@
+"""
+整形済み文字列の共有キャッシュ
+
+DrawText・DrawTableText は (文字列, 幅, 寄せ方) が同じなら前回の整形結果を使う
+表の同じ値のセル(状態列等)は行をまたいで同じ結果を共有する
+件数とおおよそのメモリ使用量の両方に上限があり、超えたら最後に使われたのが古いものから捨てる
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+import sys
+
+import eastAsianWidthOverride as ewo
+
+ta_Key = Tuple[str, int, str]
+
+# 寄せ方 → 整形関数
+ALIGN: Dict[str, Callable[[str, int], str]] = {
+    "c": ewo.center,
+    "l": ewo.ljust,
+    "r": ewo.rjust,
+}
+
+# 1件あたりの文字列以外の大きさ(キーのタプル・辞書の枠等)の見積もり
+_ENTRY_OVERHEAD = 200
+
+
+class LineCache:
+    """
+    (文字列, 幅, 寄せ方) → 整形済み文字列 の LRU キャッシュ
+    """
+
+    def __init__(self, maxEntries: int = 8192, maxBytes: int = 4 << 20) -> None:
+        """
+        maxEntries: 最大件数
+        maxBytes: 使用メモリのおおよその上限
+        """
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self._data: "OrderedDict[ta_Key, Tuple[str, int]]" = OrderedDict()
+        self._lock = Lock()
+        # 使用メモリの見積もり
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def format(self, text: str, width: int, align: str = "c") -> str:
+        """
+        text を幅 width に寄せた文字列(キャッシュにあればそれを返す)
+        """
+        key = (text, width, align)
+        ent = self._data.get(key)
+        if ent is not None:
+            # ヒット時はロックを取らない(別スレッドで捨てられていたら順番の更新だけ諦める)
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                pass
+            self.hits += 1
+            return ent[0]
+        self.misses += 1
+        value = ALIGN[align](text, width)
+        self._put(key, value)
+        return value
+
+    def _put(self, key: ta_Key, value: str) -> None:
+        size = sys.getsizeof(key[0]) + sys.getsizeof(value) + _ENTRY_OVERHEAD
+        if size > self.maxBytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (value, size)
+            self.bytes += size
+            data = self._data
+            while len(data) > self.maxEntries or self.bytes > self.maxBytes:
+                _, (_, s) = data.popitem(last=False)
+                self.bytes -= s
+                self.evictions += 1
+
+    def invalidate(self, text: Optional[str] = None) -> None:
+        """
+        キャッシュ削除(text を指定するとその文字列の分だけ)
+        """
+        with self._lock:
+            if text is None:
+                self._data.clear()
+                self.bytes = 0
+                return
+            for key in [k for k in self._data if k[0] == text]:
+                self.bytes -= self._data.pop(key)[1]
+
+    def resetStats(self) -> None:
+        """
+        ヒット数等を 0 に戻す
+        """
+        self.hits = self.misses = self.evictions = 0
+
+    def hitRate(self) -> float:
+        """
+        ヒット率(0~1)
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        統計
+        """
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": self.hitRate(),
+        }
+
+
+# 描画オブジェクトが共有するキャッシュ
+shared = LineCache()
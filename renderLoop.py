@@ -0,0 +1,186 @@
+"""
+asyncio による描画ループ
+"""
+
+from typing import Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+import asyncio
+import signal
+
+from terminalDraw import DrawObjStore, _ResizeSignal
+
+
+class RenderLoop:
+    """
+    DrawObjStore の非同期描画ドライバ
+
+    変更通知は1ティック(1/fps 秒)に最大1フレームへまとめる
+    出力が詰まっている間は次のフレームを作らないので、
+    その間の変更は書き込み完了後の1フレームに合流する
+    """
+
+    def __init__(self, store: DrawObjStore, fps: float = 30, write: Optional[Callable[[str], None]] = None) -> None:
+        """
+        fps: 最大フレームレート
+        write: 出力関数(省略時は store の出力先)
+        """
+        self.store = store
+        self.fps = fps
+        self._write = write if write != None else store._write
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._running = False
+        self._obligation = False
+        # ループで受け取る前の SIGWINCH のハンドラ
+        self._prevHandler: object = None
+        # 書き込みはブロックし得るので専用スレッドで行う(順序保証のため1本, run() の間だけ)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # 描画したフレーム数
+        self.frameCount = 0
+        # 受け付けた描画要求数(frameCount との差がまとめられた分)
+        self.requestCount = 0
+
+    def requestFrame(self, obligation: bool = False) -> None:
+        """
+        描画要求(別スレッドからも呼べる)
+        """
+        self.requestCount += 1
+        if obligation:
+            self._obligation = True
+        loop = self._loop
+        if loop == None or self._wake == None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake.set()
+        else:
+            loop.call_soon_threadsafe(self._wake.set)
+
+    def _onResize(self) -> None:
+        """
+        リサイズ通知(ループ内で実行)
+        """
+        _ResizeSignal.notify()
+        _ResizeSignal.callPrevious(self._prevHandler, signal.SIGWINCH)
+        self._scheduleResize()
+
+    def _scheduleResize(self) -> None:
+        """
+        リサイズが落ち着いた頃に描画要求を出す
+        """
+        wait = self.store.resizeWait()
+        if wait > 0 and self._loop != None:
+            self._loop.call_later(wait, self.requestFrame)
+
+    def stop(self) -> None:
+        """
+        描画ループ停止
+        """
+        self._running = False
+        self.requestFrame()
+
+    async def _waitWritable(self) -> None:
+        """
+        出力先が書き込み可能になるまで待つ(他のコルーチンは動ける)
+        """
+        loop = self._loop
+        fd = self.store.backend.fileno()
+        if fd is None:
+            return
+        assert loop != None
+        fut = loop.create_future()
+        try:
+            loop.add_writer(fd, lambda: fut.done() or fut.set_result(None))
+        except (NotImplementedError, ValueError, OSError):
+            return
+        try:
+            await fut
+        finally:
+            loop.remove_writer(fd)
+
+    async def _flush(self, data: str) -> None:
+        """
+        1フレーム分を書き込む
+        """
+        assert self._loop != None and self._executor != None
+        if self._write == self.store._write:
+            await self._waitWritable()
+        await self._loop.run_in_executor(self._executor, self._write, data)
+
+    async def _waitWake(self) -> None:
+        """
+        描画要求か、store の次の予約処理の時刻まで待つ
+        """
+        assert self._wake != None
+        timeout = self.store.timerWait()
+        if timeout is None:
+            await self._wake.wait()
+            return
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self) -> None:
+        """
+        描画ループ実行(stop() まで戻らない)
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        prevHook = self.store.changeHook
+        self.store.changeHook = self.requestFrame
+        self._running = True
+        self._wake.set()
+
+        # シグナルはループ経由で受け取る(終了時に通常のハンドラへ戻す)
+        sig = getattr(signal, "SIGWINCH", None)
+        if sig != None:
+            self._prevHandler = signal.getsignal(sig)
+            try:
+                self._loop.add_signal_handler(sig, self._onResize)
+            except (NotImplementedError, RuntimeError, ValueError):
+                sig = None
+            else:
+                _ResizeSignal.relays += 1
+
+        last = -float("inf")
+        try:
+            while self._running:
+                await self._waitWake()
+                if not self._running:
+                    break
+
+                # フレームレート上限(待っている間の変更もこのフレームに入る)
+                delay = last + 1 / self.fps - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._wake.clear()
+                last = monotonic()
+
+                obligation = self._obligation
+                self._obligation = False
+                out = self.store.renderFrame(obligation)
+                if out:
+                    self.frameCount += 1
+                    # 書き込み完了までは次のフレームを作らない
+                    await self._flush(out)
+                self._scheduleResize()
+        finally:
+            self.store.changeHook = prevHook
+            self._running = False
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            if sig != None:
+                _ResizeSignal.relays -= 1
+                self._loop.remove_signal_handler(sig)
+                # 元のハンドラに戻す(Python で設定されたものでなければ通常のハンドラを設定)
+                if self._prevHandler != None:
+                    signal.signal(sig, self._prevHandler)  # type: ignore[arg-type]
+                else:
+                    _ResizeSignal.install()
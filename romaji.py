@@ -2,7 +2,20 @@
 ひらがな、カタカナ、ローマ字変換ライブラリ
 """
 
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 from re import compile, escape
+import sys
+
+import convenientFunc as cf
+
+# 促音化する子音(_rx_xtu_k と同じ)
+_CONSONANT = "bcdfghjklmpqrstvwxyz"
+_VOWEL = "aiueo"
+
+# トライの節点 (文字 → 子節点, "" → 変換結果)
+ta_TrieNode = Dict[str, Any]
+# RomajiStream の途中状態 (mba, 促音, ローマ字, n の各段の保留文字列)
+ta_StreamState = Tuple[str, str, str, str]
 
 
 class Romaji:
@@ -106,6 +119,18 @@ class Romaji:
 
     _kana_assist = {'a': 'ァ', 'i': 'ィ', 'u': 'ゥ', 'e': 'ェ', 'o': 'ォ', }
 
+    # 変換テーブル作成済みか
+    _ready = False
+
+    @classmethod
+    def _ensureInit(cls) -> None:
+        """
+        変換テーブルを初回使用時に作成
+        """
+        if not cls._ready:
+            cls._Romaji2Init()
+            cls._ready = True
+
     @classmethod
     def _Romaji2Init(cls) -> None:
 
@@ -125,6 +150,14 @@ class Romaji:
         romaji_keys = list(cls._romaji_dict.keys())
         romaji_keys.sort(key=lambda x: len(x), reverse=True)
 
+        # 逐次変換用のトライ
+        cls._roma_trie: ta_TrieNode = {}
+        for k, v in cls._romaji_dict.items():
+            node = cls._roma_trie
+            for c in k:
+                node = node.setdefault(c, {})
+            node[""] = v
+
         cls._re_roma2kana = compile("|".join(map(escape, romaji_keys)))
         # m の後ろにバ行、パ行のときは "ン" と変換
         cls._rx_mba = compile(r"m(b|p)([aiueo])")
@@ -160,6 +193,7 @@ class Romaji:
         """
         ひらがな → カタカナ
         """
+        cls._ensureInit()
         return cls._re_hira2kata.sub(lambda x: cls._hira[x.group(0)], text)
 
     @classmethod
@@ -167,6 +201,7 @@ class Romaji:
         """
         カタカナ → ひらがな
         """
+        cls._ensureInit()
         return cls._re_kata2hira.sub(lambda x: cls._kata[x.group(0)], text)
 
     @classmethod
@@ -174,6 +209,7 @@ class Romaji:
         """
         ローマ字 → カタカナ
         """
+        cls._ensureInit()
         result = text.lower()
         result = cls._rx_mba.sub(r"ン\1\2", result)
         result = cls._rx_xtu_k.sub(r"ッ\1", result)
@@ -193,6 +229,7 @@ class Romaji:
         """
         ひらがな(カタカナ) → ローマ字
         """
+        cls._ensureInit()
         result = cls.Hira2Kata(text)
         result = cls._re_kana2roma.sub(lambda x: cls._kana_dict[x.group(0)], result)
         result = cls._rx_xtu_r.sub(r"\1\1", result)
@@ -202,4 +239,272 @@ class Romaji:
         return cls._rx_oo.sub(r"\1", result)
 
 
-Romaji._Romaji2Init()
+def _stepMba(buf: str, out: List[str], end: bool) -> str:
+    """
+    "m" + バ行・パ行 → "ン"(_rx_mba と同じ)
+    """
+    while buf:
+        if buf[0] != "m":
+            out.append(buf[0])
+            buf = buf[1:]
+        elif len(buf) == 1 or (len(buf) == 2 and buf[1] in "bp"):
+            if not end:
+                break
+            out.append(buf[0])
+            buf = buf[1:]
+        elif buf[1] in "bp" and buf[2] in _VOWEL:
+            out.append("ン" + buf[1:3])
+            buf = buf[3:]
+        else:
+            out.append(buf[0])
+            buf = buf[1:]
+    return buf
+
+
+def _stepXtu(buf: str, out: List[str], end: bool) -> str:
+    """
+    同じ子音の連続 → "ッ"(_rx_xtu_k と同じ)
+    """
+    while buf:
+        if buf[0] not in _CONSONANT:
+            out.append(buf[0])
+            buf = buf[1:]
+        elif len(buf) == 1:
+            if not end:
+                break
+            out.append(buf)
+            buf = ""
+        elif buf[1] == buf[0]:
+            out.append("ッ" + buf[0])
+            buf = buf[2:]
+        else:
+            out.append(buf[0])
+            buf = buf[1:]
+    return buf
+
+
+def _stepKana(buf: str, out: List[str], end: bool) -> str:
+    """
+    トライで最長一致したローマ字をカタカナに(_re_roma2kana と同じ)
+    """
+    trie = Romaji._roma_trie
+    while buf:
+        node = trie
+        match = ""
+        matchLen = 0
+        i = 0
+        while i < len(buf):
+            node = node.get(buf[i])
+            if node is None:
+                break
+            i += 1
+            if "" in node:
+                match = node[""]
+                matchLen = i
+        else:
+            # 全て読んでもまだ長い候補が残っていれば続きを待つ
+            if not end and len(node) > ("" in node):
+                break
+        if matchLen:
+            out.append(match)
+            buf = buf[matchLen:]
+        else:
+            out.append(buf[0])
+            buf = buf[1:]
+    return buf
+
+
+def _stepN(buf: str, out: List[str], end: bool) -> str:
+    """
+    末尾以外の "n" → "ン"(_rx_nn_k と同じ)
+    """
+    for c in buf[:-1]:
+        out.append("ン" if c == "n" else c)
+    if buf[-1:] == "n" and not end:
+        return "n"
+    out.append(buf[-1:])
+    return ""
+
+
+class RomajiStream:
+    """
+    ローマ字 → カタカナ の逐次変換
+
+    Romaji.Romaji2Kata の各置換を、数文字だけ保留する段の連なりとして実行する
+    1文字ごとの処理量は入力長によらず一定で、結果は Romaji2Kata と一致する
+    確定した部分はその時にひらがなにもしておく(Kata2Hira は1文字ずつの置換なので、繋いでも結果は同じ)
+    """
+
+    _steps = (_stepMba, _stepXtu, _stepKana, _stepN)
+
+    def __init__(self, measure: Optional[Callable[[str], int]] = None) -> None:
+        """
+        measure: 表示幅の計算関数(省略時は文字数)
+        """
+        Romaji._ensureInit()
+        self._measure = measure if measure != None else len
+        # 確定したカタカナ・ひらがな(文字数は同じ)とその幅
+        self._kata = ""
+        self._hira = ""
+        self._outWidth = 0
+        self._state: ta_StreamState = ("", "", "", "")
+        # pop() 用の履歴 (入力前の状態, 入力前の確定文字数, 入力前の幅)
+        self._history: List[Tuple[ta_StreamState, int, int]] = []
+
+    def _run(self, state: ta_StreamState, text: str, out: List[str], end: bool) -> ta_StreamState:
+        """
+        各段に text を流す
+        """
+        bufs = list(state)
+        for i, step in enumerate(RomajiStream._steps):
+            tmp: List[str] = []
+            bufs[i] = step(bufs[i] + text, tmp, end)
+            text = "".join(tmp)
+        out.append(text)
+        return (bufs[0], bufs[1], bufs[2], bufs[3])
+
+    def push(self, text: str) -> None:
+        """
+        入力追加
+        """
+        for c in text:
+            self._history.append((self._state, len(self._kata), self._outWidth))
+            out: List[str] = []
+            self._state = self._run(self._state, c.lower(), out, False)
+            if out[0]:
+                self._kata += out[0]
+                self._hira += Romaji.Kata2Hira(out[0])
+                self._outWidth += self._measure(out[0])
+
+    def pop(self) -> bool:
+        """
+        最後の1文字の入力を取り消す
+        """
+        if not self._history:
+            return False
+        self._state, n, self._outWidth = self._history.pop()
+        self._kata = self._kata[:n]
+        self._hira = self._hira[:n]
+        return True
+
+    def clear(self) -> None:
+        """
+        全消去
+        """
+        self._kata = ""
+        self._hira = ""
+        self._outWidth = 0
+        self._state = ("", "", "", "")
+        self._history = []
+
+    def committed(self) -> str:
+        """
+        以降の入力で変わらない部分
+        """
+        return self._kata
+
+    def pending(self) -> str:
+        """
+        入力がここで終わった場合の、保留部分の変換結果
+        """
+        out: List[str] = []
+        bufs = self._state
+        text = ""
+        for i, step in enumerate(RomajiStream._steps):
+            tmp: List[str] = []
+            step(bufs[i] + text, tmp, True)
+            text = "".join(tmp)
+        return text
+
+    def width(self) -> int:
+        """
+        変換結果の表示幅(確定部分は差分更新した値を使う)
+        """
+        return self._outWidth + self._measure(self.pending())
+
+    def getKata(self) -> str:
+        """
+        カタカナ取得(Romaji.Romaji2Kata と同じ結果)
+        """
+        return self.committed() + self.pending()
+
+    def getHira(self) -> str:
+        """
+        ひらがな取得(Romaji.Romaji2Hira と同じ結果)
+        """
+        return self._hira + Romaji.Kata2Hira(self.pending())
+
+
+# 一括変換で使える変換名
+CONVERT_MODES = ("Hira2Kata", "Kata2Hira", "Romaji2Kata", "Romaji2Hira", "kana2Romaji")
+
+
+def _convertChunk(args: Tuple[str, List[str]]) -> List[str]:
+    """
+    1チャンク分の変換(プロセスプールから呼ばれる)
+    """
+    mode, lines = args
+    func = getattr(Romaji, mode)
+    return [func(s) for s in lines]
+
+
+def convertIter(texts: Iterable[str], mode: str = "kana2Romaji", processes: Optional[int] = 1, chunkSize: int = 1000) -> Iterator[str]:
+    """
+    文字列を順に変換して返す
+
+    chunkSize 行ずつ processes 個(None で CPU 数)のプロセスで変換する(順序は保たれる)
+    """
+    if mode not in CONVERT_MODES:
+        raise ValueError(f"unknown mode: {mode}")
+    chunks = ((mode, c) for c in cf.chunked(texts, chunkSize))
+    for result in cf.orderedMap(_convertChunk, chunks, processes):
+        yield from result
+
+
+def convertFile(src: TextIO, dst: TextIO, mode: str = "kana2Romaji", processes: Optional[int] = 1, chunkSize: int = 1000) -> int:
+    """
+    1行1件のテキストを変換して書き出す
+
+    変換した行数を返す
+    """
+    lines = (l.rstrip("\r\n") for l in src)
+    n = 0
+    for chunk in cf.chunked(convertIter(lines, mode, processes, chunkSize), chunkSize):
+        dst.write("\n".join(chunk) + "\n")
+        n += len(chunk)
+    return n
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    コマンドライン実行
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="ひらがな・カタカナ・ローマ字の一括変換(1行1件)")
+    parser.add_argument("input", nargs="?", default="-", help="入力ファイル(省略時は標準入力)")
+    parser.add_argument("output", nargs="?", default="-", help="出力ファイル(省略時は標準出力)")
+    parser.add_argument("-m", "--mode", choices=CONVERT_MODES, default="kana2Romaji", help="変換の種類")
+    parser.add_argument("-j", "--processes", type=int, default=1, help="プロセス数(0でCPU数)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=1000, help="1プロセスにまとめて渡す行数")
+    parser.add_argument("--encoding", default="utf-8", help="入出力の文字コード")
+    args = parser.parse_args(argv)
+    if args.processes < 0:
+        parser.error("--processes は 0 以上を指定してください")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size は 1 以上を指定してください")
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding=args.encoding)
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding=args.encoding)
+    try:
+        convertFile(src, dst, args.mode, args.processes or None, args.chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
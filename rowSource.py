@@ -0,0 +1,365 @@
+"""
+テーブル用の行データ取得元
+
+DrawTableText は表示範囲の行だけをここから取り出して整形する
+"""
+
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from bisect import bisect_left, insort
+from collections import deque
+from itertools import count, islice
+
+ta_Row = Sequence[Any]
+ta_SortKey = Callable[[ta_Row], Any]
+ta_RowFilter = Callable[[ta_Row], bool]
+
+
+class RowSource:
+    """
+    行データ取得元の基底クラス
+
+    len() は現在分かっている行数、rows(start, stop) は [start, stop) の行を返す
+    内容が変わった時は subscribe() した関数に通知する
+    """
+
+    def __init__(self) -> None:
+        self._listeners: List[Callable[[], None]] = []
+
+    def subscribe(self, func: Callable[[], None]) -> None:
+        """
+        変更通知先登録
+        """
+        self._listeners.append(func)
+
+    def unsubscribe(self, func: Callable[[], None]) -> None:
+        """
+        変更通知先解除
+        """
+        if func in self._listeners:
+            self._listeners.remove(func)
+
+    def _changed(self) -> None:
+        """
+        変更通知
+        """
+        for func in list(self._listeners):
+            func()
+
+    def __len__(self) -> int:
+        return 0
+
+    def rows(self, start: int, stop: int) -> List[ta_Row]:
+        """
+        [start, stop) の行取得(範囲外は含めない)
+        """
+        return []
+
+    def ensure(self, stop: int) -> None:
+        """
+        stop 行目まで使う予定であることを通知(先読みする取得元用)
+        """
+
+    def firstIndex(self) -> int:
+        """
+        取得可能な最初の行番号
+        """
+        return 0
+
+    def iterRows(self, chunkSize: int = 1000) -> Iterator[List[ta_Row]]:
+        """
+        取得可能な最初の行から全行を chunkSize 行ずつ取り出す(書き出し等用)
+        """
+        chunkSize = max(chunkSize, 1)
+        start = self.firstIndex()
+        while True:
+            self.ensure(start + chunkSize)
+            rows = self.rows(start, start + chunkSize)
+            if not rows:
+                return
+            yield rows
+            start += len(rows)
+
+
+class SequenceSource(RowSource):
+    """
+    リスト等の添字アクセスできるデータ
+    """
+
+    def __init__(self, data: Sequence[ta_Row]) -> None:
+        super().__init__()
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def rows(self, start: int, stop: int) -> List[ta_Row]:
+        data = self.data
+        return [data[i] for i in range(max(start, 0), min(stop, len(data)))]
+
+
+class CallableSource(RowSource):
+    """
+    範囲を指定して行を取り出す関数(DB のページング取得等)
+
+    fetch(start, stop) は [start, stop) の行を返す
+    length は総行数か、総行数を返す関数
+    """
+
+    def __init__(self, fetch: Callable[[int, int], Sequence[ta_Row]], length: Union[int, Callable[[], int]]) -> None:
+        super().__init__()
+        self.fetch = fetch
+        self.length = length
+
+    def __len__(self) -> int:
+        if isinstance(self.length, int):
+            return self.length
+        return self.length()
+
+    def rows(self, start: int, stop: int) -> List[ta_Row]:
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        return list(self.fetch(start, stop))[:stop-start]
+
+
+class IteratorSource(RowSource):
+    """
+    イテレータ(先頭から順にしか読めないデータ)
+
+    表示に必要な行より readAhead 行先まで読み、
+    直近の keep 行だけを保持する(それより前には戻れない)
+    """
+
+    def __init__(self, it: Iterable[ta_Row], readAhead: int = 100, keep: int = 10000) -> None:
+        super().__init__()
+        self._it: Iterator[ta_Row] = iter(it)
+        self.readAhead = readAhead
+        # (行番号, 行) を直近 keep 行分だけ持つ
+        self._buf: Deque[Tuple[int, ta_Row]] = deque(maxlen=max(keep, 1))
+        # 読み込み済みの行数
+        self._count = 0
+        # イテレータを読み切ったか
+        self.exhausted = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def firstIndex(self) -> int:
+        return self._buf[0][0] if self._buf else self._count
+
+    def ensure(self, stop: int) -> None:
+        need = stop + self.readAhead - self._count
+        if need <= 0 or self.exhausted:
+            return
+        self._buf.extend(zip(count(self._count), islice(self._it, need)))
+        read = self._buf[-1][0] + 1 - self._count if self._buf else 0
+        self._count += read
+        if read < need:
+            self.exhausted = True
+
+    def rows(self, start: int, stop: int) -> List[ta_Row]:
+        self.ensure(stop)
+        first = self.firstIndex()
+        start = max(start, first)
+        stop = min(stop, self._count)
+        if start >= stop:
+            return []
+        return [row for _, row in islice(self._buf, start-first, stop-first)]
+
+    def iterRows(self, chunkSize: int = 1000) -> Iterator[List[ta_Row]]:
+        # 先読み分を含めて保持できる行数を超えると取り出す前に捨てられるので、それより小さく分ける
+        keep = self._buf.maxlen or 1
+        return super().iterRows(min(chunkSize, max(keep - self.readAhead, 1)))
+
+
+class IndexedRows(RowSource):
+    """
+    並べ替え・絞り込みの索引付きの行データ
+
+    行は行IDで管理し、索引は (並べ替えキー, 行ID) の整列済みリストで持つ
+    行の追加・更新・削除は二分探索で索引を差分更新するので、全体を並べ直さない
+    行を直接書き換えた場合は update() で知らせる
+    """
+
+    def __init__(self, rows: Iterable[ta_Row] = (), key: Optional[ta_SortKey] = None, reverse: bool = False, rowFilter: Optional[ta_RowFilter] = None) -> None:
+        super().__init__()
+        self._rows: Dict[int, ta_Row] = {}
+        # 行ID → 並べ替えキー
+        self._keys: Dict[int, Any] = {}
+        self._nextId = 0
+        self.key = key
+        self.reverse = reverse
+        self.rowFilter = rowFilter
+        # 全行の索引と、絞り込み後の索引
+        self._all: List[Tuple[Any, int]] = []
+        self._visible: List[Tuple[Any, int]] = []
+        self.extend(rows)
+
+    def _sortKey(self, rowId: int, row: ta_Row) -> Any:
+        return rowId if self.key is None else self.key(row)
+
+    def _passes(self, row: ta_Row) -> bool:
+        return self.rowFilter is None or self.rowFilter(row)
+
+    def __len__(self) -> int:
+        return len(self._visible)
+
+    def _index(self, i: int) -> int:
+        """
+        表示順の位置 → 索引上の位置
+        """
+        return len(self._visible) - 1 - i if self.reverse else i
+
+    def rows(self, start: int, stop: int) -> List[ta_Row]:
+        start = max(start, 0)
+        stop = min(stop, len(self._visible))
+        if start >= stop:
+            return []
+        rows = self._rows
+        if self.reverse:
+            n = len(self._visible)
+            part = self._visible[n-stop:n-start][::-1]
+        else:
+            part = self._visible[start:stop]
+        return [rows[rowId] for _, rowId in part]
+
+    def rowId(self, i: int) -> int:
+        """
+        表示順で i 番目の行の行ID
+        """
+        return self._visible[self._index(i)][1]
+
+    def row(self, rowId: int) -> ta_Row:
+        """
+        行IDの行取得
+        """
+        return self._rows[rowId]
+
+    def position(self, rowId: int) -> int:
+        """
+        行IDの表示順の位置(絞り込みで表示されない場合は -1)
+        """
+        entry = (self._keys[rowId], rowId)
+        i = bisect_left(self._visible, entry)
+        if i < len(self._visible) and self._visible[i] == entry:
+            return self._index(i)
+        return -1
+
+    def _insert(self, rowId: int, row: ta_Row) -> None:
+        k = self._sortKey(rowId, row)
+        self._keys[rowId] = k
+        insort(self._all, (k, rowId))
+        if self._passes(row):
+            insort(self._visible, (k, rowId))
+
+    def _remove(self, rowId: int) -> None:
+        entry = (self._keys.pop(rowId), rowId)
+        for index in (self._all, self._visible):
+            i = bisect_left(index, entry)
+            if i < len(index) and index[i] == entry:
+                del index[i]
+
+    def append(self, row: ta_Row) -> int:
+        """
+        行追加(行IDを返す)
+        """
+        rowId = self._nextId
+        self._nextId += 1
+        self._rows[rowId] = row
+        self._insert(rowId, row)
+        self._changed()
+        return rowId
+
+    def extend(self, rows: Iterable[ta_Row]) -> List[int]:
+        """
+        複数行追加(まとめて並べ替える)
+        """
+        ids: List[int] = []
+        for row in rows:
+            rowId = self._nextId
+            self._nextId += 1
+            self._rows[rowId] = row
+            k = self._sortKey(rowId, row)
+            self._keys[rowId] = k
+            self._all.append((k, rowId))
+            if self._passes(row):
+                self._visible.append((k, rowId))
+            ids.append(rowId)
+        if ids:
+            # 既存部分は整列済みなので timsort がほぼ併合だけで済む
+            self._all.sort()
+            self._visible.sort()
+            self._changed()
+        return ids
+
+    def update(self, rowId: int, row: Optional[ta_Row] = None) -> None:
+        """
+        行更新(row 省略時は行を直接書き換えたものとして索引だけ直す)
+        """
+        if row is None:
+            row = self._rows[rowId]
+        self._remove(rowId)
+        self._rows[rowId] = row
+        self._insert(rowId, row)
+        self._changed()
+
+    def delete(self, rowId: int) -> None:
+        """
+        行削除
+        """
+        self._remove(rowId)
+        del self._rows[rowId]
+        self._changed()
+
+    def clear(self) -> None:
+        """
+        全行削除
+        """
+        self._rows.clear()
+        self._keys.clear()
+        self._all = []
+        self._visible = []
+        self._changed()
+
+    def setSort(self, key: Optional[ta_SortKey] = None, reverse: bool = False) -> None:
+        """
+        並べ替えキー変更(key 省略で追加順)
+        """
+        if key is not self.key:
+            self.key = key
+            rows = self._rows
+            self._keys = {rowId: self._sortKey(rowId, row) for rowId, row in rows.items()}
+            self._all = sorted((k, rowId) for rowId, k in self._keys.items())
+            self._refilter()
+        self.reverse = reverse
+        self._changed()
+
+    def setFilter(self, rowFilter: Optional[ta_RowFilter] = None) -> None:
+        """
+        絞り込み条件変更(省略で解除)
+
+        全行の索引から選び直すだけなので並べ替えはしない
+        """
+        self.rowFilter = rowFilter
+        self._refilter()
+        self._changed()
+
+    def _refilter(self) -> None:
+        if self.rowFilter is None:
+            self._visible = list(self._all)
+        else:
+            rows = self._rows
+            rowFilter = self.rowFilter
+            self._visible = [e for e in self._all if rowFilter(rows[e[1]])]
+
+
+def toRowSource(data: Union[RowSource, Sequence[ta_Row], Iterable[ta_Row]]) -> RowSource:
+    """
+    データを行データ取得元に変換
+    """
+    if isinstance(data, RowSource):
+        return data
+    if isinstance(data, Sequence):
+        return SequenceSource(data)
+    return IteratorSource(data)
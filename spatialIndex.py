@@ -0,0 +1,130 @@
+"""
+矩形の空間索引
+
+画面を cellW × cellH のマスに区切り、マスごとにそこへ掛かる要素を持つ
+点・矩形の検索は掛かるマスの要素だけを調べるので、要素数が多くても速い
+"""
+
+from typing import Dict, Generic, Hashable, List, Optional, Set, Tuple, TypeVar
+
+ta_Rect = Tuple[int, int, int, int]
+T = TypeVar("T", bound=Hashable)
+
+
+class SpatialIndex(Generic[T]):
+    """
+    要素 → 矩形(x, y, sx, sy) の索引
+    """
+
+    def __init__(self, cellW: int = 16, cellH: int = 4) -> None:
+        self.cellW = cellW
+        self.cellH = cellH
+        self._rects: Dict[T, ta_Rect] = {}
+        # マス → そこへ掛かる要素
+        self._cells: Dict[Tuple[int, int], Set[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rects)
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._rects
+
+    def _span(self, rect: ta_Rect) -> Tuple[int, int, int, int]:
+        """
+        矩形が掛かるマスの範囲(両端含む)
+        """
+        x, y, sx, sy = rect
+        return (x // self.cellW, y // self.cellH, (x+sx-1) // self.cellW, (y+sy-1) // self.cellH)
+
+    def rect(self, item: T) -> Optional[ta_Rect]:
+        """
+        登録されている矩形
+        """
+        return self._rects.get(item)
+
+    def update(self, item: T, rect: ta_Rect) -> None:
+        """
+        要素の矩形登録・変更(大きさ 0 の矩形なら登録を外す)
+        """
+        old = self._rects.get(item)
+        if old == rect:
+            return
+        if old != None:
+            self.remove(item)
+        if rect[2] <= 0 or rect[3] <= 0:
+            return
+        self._rects[item] = rect
+        cells = self._cells
+        bx0, by0, bx1, by1 = self._span(rect)
+        for by in range(by0, by1+1):
+            for bx in range(bx0, bx1+1):
+                bucket = cells.get((bx, by))
+                if bucket is None:
+                    cells[(bx, by)] = {item}
+                else:
+                    bucket.add(item)
+
+    def remove(self, item: T) -> None:
+        """
+        要素の登録を外す
+        """
+        rect = self._rects.pop(item, None)
+        if rect is None:
+            return
+        cells = self._cells
+        bx0, by0, bx1, by1 = self._span(rect)
+        for by in range(by0, by1+1):
+            for bx in range(bx0, bx1+1):
+                bucket = cells.get((bx, by))
+                if bucket != None:
+                    bucket.discard(item)
+                    if not bucket:
+                        del cells[(bx, by)]
+
+    def clear(self) -> None:
+        """
+        全要素の登録を外す
+        """
+        self._rects.clear()
+        self._cells.clear()
+
+    def at(self, x: int, y: int) -> List[T]:
+        """
+        点 (x, y) を含む要素
+        """
+        bucket = self._cells.get((x // self.cellW, y // self.cellH))
+        if not bucket:
+            return []
+        rects = self._rects
+        hits: List[T] = []
+        for item in bucket:
+            r = rects[item]
+            if r[0] <= x < r[0]+r[2] and r[1] <= y < r[1]+r[3]:
+                hits.append(item)
+        return hits
+
+    def query(self, rect: ta_Rect) -> Set[T]:
+        """
+        矩形と重なる要素
+        """
+        if rect[2] <= 0 or rect[3] <= 0:
+            return set()
+        x0, y0 = rect[0], rect[1]
+        x1, y1 = x0 + rect[2], y0 + rect[3]
+        cells = self._cells
+        rects = self._rects
+        bx0, by0, bx1, by1 = self._span(rect)
+        found: Set[T] = set()
+        if (bx1-bx0+1) * (by1-by0+1) > len(cells):
+            # マスの数より広い範囲なら使われているマスだけを見る
+            buckets = [b for (bx, by), b in cells.items() if bx0 <= bx <= bx1 and by0 <= by <= by1]
+        else:
+            buckets = [b for b in (cells.get((bx, by)) for by in range(by0, by1+1) for bx in range(bx0, bx1+1)) if b]
+        for bucket in buckets:
+            for item in bucket:
+                if item in found:
+                    continue
+                r = rects[item]
+                if r[0] < x1 and x0 < r[0]+r[2] and r[1] < y1 and y0 < r[1]+r[3]:
+                    found.add(item)
+        return found
@@ -0,0 +1,81 @@
+"""
+テーブルの書き出し
+
+DrawTableText と同じ列設定(settingList の幅と c/l/r の寄せ方)で全行を整形し、
+ファイル等へ少しずつ書き出す(全行を1つの文字列にしない)
+processes を指定すると行のまとまりごとにプロセスプールで整形し、元の順に書き出す
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Union, TYPE_CHECKING
+from functools import partial
+import os
+
+import eastAsianWidthOverride as ewo
+import convenientFunc as cf
+import lineCache as lc
+
+if TYPE_CHECKING:
+    from rowSource import RowSource
+
+ta_Setting = Sequence[Sequence[Union[int, str]]]
+
+
+def formatRow(row: Sequence[Any], settingList: ta_Setting, fmt: Callable[[str, int, str], str] = lc.shared.format) -> str:
+    """
+    1行整形(各セルを列幅に寄せて空白区切りで繋ぐ)
+    """
+    return "".join(fmt(str(cell), int(width), str(align)) + " " for (width, align, *_), cell in zip(settingList, row))
+
+
+def _align(text: str, width: int, align: str) -> str:
+    return lc.ALIGN[align](text, width)
+
+
+def formatChunk(rows: List[Sequence[Any]], settingList: ta_Setting, ansi: bool = True) -> str:
+    """
+    複数行を整形して改行で繋ぐ(プロセスプールで実行できるようにモジュールの関数にしている)
+
+    ansi: False ならエスケープシーケンス(色等)を除く
+    各行は列幅どおりの固定幅にする(formatRow() が最後のセルの後に付ける区切りの空白だけ除く)
+    書き出しは値がほとんど重複しないので、表示用の共有キャッシュは使わない(表示中の内容を追い出さないため)
+    """
+    lines = [formatRow(row, settingList, _align)[:-1] for row in rows]
+    if not ansi:
+        lines = [ewo.stripEscape(l) for l in lines]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def exportRows(source: Union["RowSource", Iterable[Sequence[Any]]], settingList: ta_Setting, out: Any,
+               chunkSize: int = 5000, processes: Optional[int] = 1, header: Optional[Sequence[Any]] = None,
+               ansi: bool = True, encoding: str = "utf-8") -> int:
+    """
+    全行を整形して書き出す(書き出した行数を返す, header は数えない)
+
+    source: RowSource か行のイテラブル
+    out: ファイルパスか write() を持つオブジェクト
+    chunkSize: 1回に整形・書き出しする行数
+    processes: 整形に使うプロセス数(1 ならこのプロセス, None なら CPU 数)
+    """
+    if isinstance(out, (str, bytes, os.PathLike)):
+        with open(out, "w", encoding=encoding, newline="\n") as f:
+            return exportRows(source, settingList, f, chunkSize, processes, header, ansi, encoding)
+
+    chunks: Iterator[List[Sequence[Any]]]
+    if hasattr(source, "iterRows"):
+        chunks = source.iterRows(chunkSize)  # type: ignore[union-attr]
+    else:
+        chunks = cf.chunked(source, max(chunkSize, 1))
+
+    if header != None:
+        out.write(formatChunk([header], settingList, ansi))
+    count = 0
+
+    def counted() -> Iterator[List[Sequence[Any]]]:
+        nonlocal count
+        for rows in chunks:
+            count += len(rows)
+            yield rows
+
+    for text in cf.orderedMap(partial(formatChunk, settingList=[list(s) for s in settingList], ansi=ansi), counted(), processes):
+        out.write(text)
+    return count
@@ -0,0 +1,303 @@
+"""
+DrawObjStore の出力先
+
+StdoutBackend: 実際の端末(標準出力)
+VirtualScreen: メモリ上の仮想端末(TTY 無しで描画・スナップショットを取る)
+"""
+
+from typing import List, Optional, Tuple
+from re import compile, DOTALL
+import sys
+
+import eastAsianWidthOverride as ewo
+from cellStyle import applySgr, transition
+
+# CSI シーケンス(引数, 終端文字) / その他のエスケープ / 文字列
+_re_token = compile(r"\033\[([0-9;?]*)[ -/]*([@-~])|\033.?|([^\033]+)", DOTALL)
+_re_newline = compile(r"(\r\n|\r|\n)")
+
+
+class Backend:
+    """
+    出力先の基底クラス
+    """
+
+    def write(self, s: str) -> None:
+        """
+        出力(1フレーム分ずつ呼ばれる)
+        """
+
+    def size(self) -> Optional[Tuple[int, int]]:
+        """
+        描画に使う (桁数, 行数)(None なら実際の端末サイズを使う)
+        """
+        return None
+
+    def fileno(self) -> Optional[int]:
+        """
+        書き込み可能になるのを待てるファイル記述子(無ければ None)
+        """
+        return None
+
+
+class StdoutBackend(Backend):
+    """
+    標準出力
+    """
+
+    def write(self, s: str) -> None:
+        sys.stdout.write(s)
+        sys.stdout.flush()
+
+    def fileno(self) -> Optional[int]:
+        try:
+            return sys.stdout.fileno()
+        except (AttributeError, ValueError, OSError):
+            return None
+
+
+class VirtualScreen(Backend):
+    """
+    仮想端末
+
+    出力されたカーソル移動・SGR 等を解釈してセル配列に反映する
+    サイズは固定で、DrawObjStore はこのサイズで描画する
+    行末での自動折り返しはしない(はみ出た文字は捨てる)
+    """
+
+    def __init__(self, column: int = 80, line: int = 24) -> None:
+        self.column = column
+        self.line = line
+        self.chars: List[List[str]] = []
+        self.styles: List[List[int]] = []
+        # カーソル位置(0始まり)
+        self.x = 0
+        self.y = 0
+        # 現在のスタイル(cellStyle の整数)
+        self.style = 0
+        # スクロール領域(0始まり, 両端含む)
+        self.top = 0
+        self.bottom = line - 1
+        # 書き込まれた回数・文字数
+        self.writes = 0
+        self.written = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        画面を空にする
+        """
+        self.chars = [[" "]*self.column for _ in range(self.line)]
+        self.styles = [[0]*self.column for _ in range(self.line)]
+        self.x = self.y = 0
+        self.style = 0
+        self.top = 0
+        self.bottom = self.line - 1
+
+    def resize(self, column: int, line: int) -> None:
+        """
+        サイズ変更(次の描画で DrawObjStore が全体を描き直す)
+        """
+        self.column = column
+        self.line = line
+        self.reset()
+
+    def size(self) -> Optional[Tuple[int, int]]:
+        return (self.column, self.line)
+
+    def write(self, s: str) -> None:
+        self.writes += 1
+        self.written += len(s)
+        self.feed(s)
+
+    # 解釈
+
+    def feed(self, data: str) -> None:
+        """
+        出力文字列を解釈して画面に反映
+        """
+        for m in _re_token.finditer(data):
+            text = m.group(3)
+            if text is not None:
+                self._text(text)
+                continue
+            cmd = m.group(2)
+            if cmd is not None:
+                self._csi(m.group(1), cmd)
+
+    def _csi(self, param: str, cmd: str) -> None:
+        if param.startswith("?"):
+            # 端末のモード設定は画面に影響しない
+            return
+        args = [int(p) if p else 0 for p in param.split(";")] if param else []
+        n = args[0] if args and args[0] > 0 else 1
+        if cmd == "m":
+            self.style = applySgr(self.style, param)
+        elif cmd == "H" or cmd == "f":
+            self.y = min(max(n, 1), self.line) - 1
+            self.x = min(max(args[1] if len(args) > 1 and args[1] > 0 else 1, 1), self.column) - 1
+        elif cmd == "C":
+            self.x = min(self.x + n, self.column - 1)
+        elif cmd == "D":
+            self.x = max(self.x - n, 0)
+        elif cmd == "A":
+            self.y = max(self.y - n, 0)
+        elif cmd == "B":
+            self.y = min(self.y + n, self.line - 1)
+        elif cmd == "G":
+            self.x = min(n, self.column) - 1
+        elif cmd == "J":
+            mode = args[0] if args else 0
+            if mode == 2 or mode == 3:
+                self._blank(0, self.line)
+            elif mode == 0:
+                self._blankRow(self.y, self.x, self.column)
+                self._blank(self.y + 1, self.line)
+            elif mode == 1:
+                self._blank(0, self.y)
+                self._blankRow(self.y, 0, self.x + 1)
+        elif cmd == "K":
+            mode = args[0] if args else 0
+            if mode == 0:
+                self._blankRow(self.y, self.x, self.column)
+            elif mode == 1:
+                self._blankRow(self.y, 0, self.x + 1)
+            else:
+                self._blankRow(self.y, 0, self.column)
+        elif cmd == "r":
+            top = n - 1
+            bottom = (args[1] if len(args) > 1 and args[1] > 0 else self.line) - 1
+            if top < bottom < self.line:
+                self.top, self.bottom = top, bottom
+            else:
+                self.top, self.bottom = 0, self.line - 1
+            self.x = self.y = 0
+        elif cmd == "S":
+            self._scroll(n)
+        elif cmd == "T":
+            self._scroll(-n)
+
+    def _blankRow(self, y: int, x0: int, x1: int) -> None:
+        k = x1 - x0
+        if k > 0:
+            self.chars[y][x0:x1] = [" "]*k
+            self.styles[y][x0:x1] = [0]*k
+
+    def _blank(self, y0: int, y1: int) -> None:
+        for y in range(max(y0, 0), min(y1, self.line)):
+            self._blankRow(y, 0, self.column)
+
+    def _scroll(self, n: int) -> None:
+        """
+        スクロール領域を n 行上へ(負なら下へ)
+        """
+        top = self.top
+        bottom = self.bottom + 1
+        n = max(min(n, bottom - top), -(bottom - top))
+        for grid, blank in ((self.chars, " "), (self.styles, 0)):
+            rows = grid[top:bottom]
+            new = [[blank]*self.column for _ in range(abs(n))]
+            grid[top:bottom] = rows[n:] + new if n > 0 else new + rows[:len(rows)+n]
+
+    def _text(self, text: str) -> None:
+        if "\n" not in text and "\r" not in text:
+            self._put(text)
+            return
+        for part in _re_newline.split(text):
+            if part == "\r":
+                self.x = 0
+            elif part == "\n" or part == "\r\n":
+                self.x = 0
+                if self.y == self.bottom:
+                    self._scroll(1)
+                else:
+                    self.y = min(self.y + 1, self.line - 1)
+            elif part:
+                self._put(part)
+
+    def _put(self, text: str) -> None:
+        """
+        カーソル位置から文字を書く
+        """
+        y = self.y
+        x = self.x
+        column = self.column
+        chars = self.chars[y]
+        styles = self.styles[y]
+        style = self.style
+        if text.isascii() and text.isprintable():
+            end = min(x + len(text), column)
+            k = end - x
+            if k > 0:
+                self._split(chars, x, end)
+                chars[x:end] = text[:k]
+                styles[x:end] = [style]*k
+            self.x = end
+            return
+        for c in text:
+            if c < " " or c == "\x7f":
+                continue
+            w = ewo.cwidth(c)
+            if w == 0:
+                p = x - 1
+                if p > 0 and chars[p] == "":
+                    p -= 1
+                if p >= 0:
+                    chars[p] += c
+                continue
+            if x + w > column:
+                break
+            self._split(chars, x, x + w)
+            chars[x] = c
+            styles[x] = style
+            if w == 2:
+                chars[x+1] = ""
+                styles[x+1] = style
+            x += w
+        self.x = x
+
+    def _split(self, chars: List[str], x0: int, x1: int) -> None:
+        """
+        [x0, x1) を上書きする時に、片側だけ上書きされる全角文字を空白にする
+        """
+        if chars[x0] == "" and x0 > 0:
+            chars[x0-1] = " "
+        if x1 < self.column and chars[x1] == "":
+            chars[x1] = " "
+
+    # スナップショット
+
+    def cell(self, x: int, y: int) -> Tuple[str, int]:
+        """
+        セルの (文字, スタイル) 取得(座標は1始まり)
+        """
+        return self.chars[y-1][x-1], self.styles[y-1][x-1]
+
+    def lines(self) -> List[str]:
+        """
+        各行の文字列
+        """
+        return ["".join(row) for row in self.chars]
+
+    def text(self) -> str:
+        """
+        画面全体の文字列(行末の空白は除く)
+        """
+        return "\n".join(l.rstrip() for l in self.lines())
+
+    def ansi(self) -> str:
+        """
+        色付きで画面全体を再現する文字列
+        """
+        out: List[str] = []
+        for chars, styles in zip(self.chars, self.styles):
+            cur = 0
+            for c, s in zip(chars, styles):
+                if s != cur:
+                    out.append(transition(cur, s))
+                    cur = s
+                out.append(c)
+            if cur:
+                out.append("\033[0m")
+            out.append("\n")
+        return "".join(out[:-1])
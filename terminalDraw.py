@@ -2,24 +2,43 @@
 terminal描画関連ライブラリ
 """
 
-from typing import Optional, Union, Any, Callable, Dict, List, Final, final
+from typing import Optional, Union, Any, Callable, Deque, Dict, Iterable, List, Sequence, Tuple, Final, final, TYPE_CHECKING
 from dataclasses import dataclass
 
 from shutil import get_terminal_size
-from os import system
-from re import search
-from time import sleep
+from re import search, compile, Pattern
+from functools import lru_cache
+from time import monotonic
+from weakref import WeakSet
+from collections import deque
+from itertools import islice
+from threading import Lock
+import heapq
+import signal
 
 import eastAsianWidthOverride as ewo
-from romaji import Romaji
+from frameBuffer import FrameBuffer
+from editBuffer import EditBuffer
+from layout import Box
+from spatialIndex import SpatialIndex
+from rowSource import IndexedRows, RowSource, ta_RowFilter, ta_SortKey, toRowSource
+from terminalBackend import Backend, StdoutBackend
+from cellStyle import applySgr
 import convenientFunc as cf
+import lineCache as lc
+from tableExport import formatRow
+
+if TYPE_CHECKING:
+    from frameProfiler import FrameProfiler
 
 # type aliases
 ta_Pos = Union[int, Callable[[Any], int]]
 ta_RePos = Optional[ta_Pos]
-ta_Draw = Union["DrawSquare", "DrawText", "DrawTableText"]
+ta_Draw = Union["DrawSquare", "DrawText", "DrawTableText", "DrawLogText"]
 ta_ListText = List[List[str]]
+ta_TableRows = Union[ta_ListText, RowSource]
 ta_keyDict = Dict[str, str]
+ta_Rect = Tuple[int, int, int, int]
 
 # ここまで
 
@@ -37,6 +56,9 @@ def jpReplace(s: str, jpMode: int) -> str:
     """
     日本語入力用に置換
     """
+    if jpMode != 0:
+        # 日本語入力を使わないプログラムでは読み込まない
+        from romaji import Romaji
     if ewo.slen(s) >= 1 and s[-1] != "\u0000":
         if jpMode == 0:
             s = s.replace("\u0000", "")
@@ -51,8 +73,76 @@ def jpReplace(s: str, jpMode: int) -> str:
     return s
 
 
+@lru_cache(maxsize=32)
+def _allowPattern(allowKeyRegex: str) -> Pattern[str]:
+    """
+    入力許可文字の連続にマッチする正規表現
+    """
+    return compile(f"[{allowKeyRegex}]+")
+
+
 def maxStrLen(l: List[str]) -> int:
-    return ewo.slen(max(l, key=lambda x: ewo.slen(x)))
+    return max(ewo.slens(l), default=0)
+
+
+def _mergeRows(rects: List[ta_Rect], line: int) -> List[Tuple[int, int]]:
+    """
+    矩形の行範囲を画面内に収めて結合(1始まり, 両端含む)
+    """
+    rows = sorted((max(r[1], 1), min(r[1]+r[3]-1, line)) for r in rects)
+    merged: List[Tuple[int, int]] = []
+    for y0, y1 in rows:
+        if y0 > y1:
+            continue
+        if merged and y0 <= merged[-1][1] + 1:
+            if y1 > merged[-1][1]:
+                merged[-1] = (merged[-1][0], y1)
+        else:
+            merged.append((y0, y1))
+    return merged
+
+
+def _visibleRows(rect: ta_Rect, occluders: List[ta_Rect], column: int, line: int) -> Optional[Tuple[int, int]]:
+    """
+    rect のうち occluders(不透明な矩形)に隠れていない行の範囲(1始まり, 両端含む)
+
+    全て隠れていれば None
+    """
+    x0 = max(rect[0], 1)
+    x1 = min(rect[0]+rect[2]-1, column)
+    y0 = max(rect[1], 1)
+    y1 = min(rect[1]+rect[3]-1, line)
+    if x0 > x1 or y0 > y1 or not occluders:
+        return (rect[1], rect[1]+rect[3]-1)
+    over = [o for o in occluders if o[0] <= x1 and x0 < o[0]+o[2] and o[1] <= y1 and y0 < o[1]+o[3]]
+    if not over:
+        return (rect[1], rect[1]+rect[3]-1)
+    for o in over:
+        if o[0] <= x0 and x1 < o[0]+o[2] and o[1] <= y0 and y1 < o[1]+o[3]:
+            return None
+
+    def covered(y: int) -> bool:
+        # その行で x0~x1 が隙間なく覆われているか
+        spans = sorted((o[0], o[0]+o[2]-1) for o in over if o[1] <= y < o[1]+o[3])
+        reach = x0 - 1
+        for a, b in spans:
+            if a > reach + 1:
+                return False
+            reach = max(reach, b)
+            if reach >= x1:
+                return True
+        return False
+
+    top = y0
+    while top <= y1 and covered(top):
+        top += 1
+    if top > y1:
+        return None
+    bottom = y1
+    while bottom > top and covered(bottom):
+        bottom -= 1
+    # 画面外の行は隠れていないので元の範囲のまま
+    return (rect[1] if top == y0 else top, rect[1]+rect[3]-1 if bottom == y1 else bottom)
 
 
 @final
@@ -64,14 +154,137 @@ class _tsDict:
     def __init__(self) -> None:
         self.column = 0
         self.line = 0
+        # サイズ再取得が必要か(リサイズ通知で立つ)
+        self._stale = True
+        # 最後にサイズ変化を検知した時刻
+        self._staleAt = 0.0
+        self._pending: Optional[Tuple[int, int]] = None
+        # 固定サイズを返す関数(仮想端末等, None を返したら実際の端末サイズを使う)
+        self.sizeFunc: Optional[Callable[[], Optional[Tuple[int, int]]]] = None
+        # 描画位置・整形済みの行の作り直しが必要になる度に増える(DrawObjStore.displayChange(), 全体再描画)
+        self.generation = 0
+
+    def markStale(self) -> None:
+        """
+        リサイズ通知
+        """
+        self._stale = True
+        self._staleAt = monotonic()
 
-    def renewal(self) -> None:
+    def staleWait(self, debounce: float = 0) -> float:
+        """
+        保留中のリサイズを反映できるまでの残り秒数(保留が無ければ 0)
+        """
+        if not (self._stale or self._pending != None):
+            return 0
+        return max(self._staleAt + debounce - monotonic(), 0)
+
+    def renewal(self, debounce: float = 0) -> None:
         """
         ターミナルサイズ更新
+
+        リサイズ通知が使える環境では通知があった時だけ取得する
+        サイズ変化が debounce 秒続かなくなるまで反映を保留する
         """
+        if self.sizeFunc != None:
+            fixed = self.sizeFunc()
+            if fixed != None:
+                self.column, self.line = fixed
+                self._stale = False
+                self._pending = None
+                return
+        if not self._stale and _ResizeSignal.watching():
+            return
         ts = get_terminal_size()
-        self.column = ts.columns - ts.columns % 2
-        self.line = ts.lines-1
+        size = (ts.columns - ts.columns % 2, ts.lines-1)
+        if self.column != 0 and size != (self.column, self.line):
+            if size != self._pending:
+                self._pending = size
+                self._staleAt = monotonic()
+            if monotonic() - self._staleAt < debounce:
+                return
+        self.column, self.line = size
+        self._stale = False
+        self._pending = None
+
+
+@final
+class _ResizeSignal:
+    """
+    SIGWINCH によるリサイズ通知(プロセス全体で1つ)
+
+    設定前のハンドラも続けて呼ぶ
+    後から他のハンドラに置き換えられたら通知は使わず、サイズを毎回取得する
+    """
+
+    # ハンドラ設定済みか(未設定ならサイズは毎回取得する)
+    active: bool = False
+    # ハンドラ設定前のハンドラ
+    _previous: Any = None
+    # 代わりにシグナルを受け取って notify() を呼んでいるもの(RenderLoop 等)の数
+    relays: int = 0
+    _stores: "WeakSet[DrawObjStore]" = WeakSet()
+
+    @classmethod
+    def register(cls, store: "DrawObjStore") -> None:
+        """
+        通知先追加
+        """
+        cls._stores.add(store)
+        if not cls.active:
+            cls.install()
+
+    @classmethod
+    def install(cls) -> None:
+        """
+        シグナルハンドラ設定(SIGWINCH が無い環境・メインスレッド以外では何もしない)
+        """
+        sig = getattr(signal, "SIGWINCH", None)
+        if sig == None:
+            return
+        try:
+            prev = signal.getsignal(sig)
+            if prev != cls._handler:
+                signal.signal(sig, cls._handler)
+                cls._previous = prev
+        except ValueError:
+            return
+        cls.active = True
+
+    @classmethod
+    def watching(cls) -> bool:
+        """
+        リサイズ通知を受け取れるか(置き換えられていたら以後は False)
+        """
+        if cls.relays > 0:
+            return True
+        if cls.active and signal.getsignal(signal.SIGWINCH) != cls._handler:
+            cls.active = False
+        return cls.active
+
+    @classmethod
+    def notify(cls) -> None:
+        """
+        全ての通知先のサイズを要再取得にする
+        """
+        for store in list(cls._stores):
+            store.tsd.markStale()
+            store._notifyChange()
+
+    @classmethod
+    def callPrevious(cls, handler: Any, signum: int, frame: Any = None) -> None:
+        """
+        置き換える前のハンドラを呼ぶ(このクラスのハンドラならさらにその前のもの)
+        """
+        if handler == cls._handler:
+            handler = cls._previous
+        if callable(handler):
+            handler(signum, frame)
+
+    @classmethod
+    def _handler(cls, signum: int, frame: Any) -> None:
+        cls.notify()
+        cls.callPrevious(cls._previous, signum, frame)
 
 
 class Draw:
@@ -87,19 +300,93 @@ class Draw:
         self.y = y
         self.sx = sx
         self.sy = sy
+        self.posX = 0
+        self.posY = 0
+        self.posSX = 0
+        self.posSY = 0
+        # 文字のスタイル(cellStyle の整数, W_Color.style() で作れる)
+        self.style = 0
+
+        # 再描画が必要か(DrawObjStore が描画後に下ろす)
+        self._dirty = True
+        # 前回描画した矩形
+        self._lastRect: Optional[ta_Rect] = None
+        # 所属レイヤー(DrawObjStore が設定)
+        self._layerRef: Optional[List[Any]] = None
+        # 変更通知先(DrawObjStore が設定)
+        self._changeHook: Optional[Callable[["Draw"], None]] = None
+        # 描画範囲(getRect)の全セルを書くか(上のレイヤーにある時、下を描かずに済ませる)
+        self.opaque = False
+        # レイヤー内の描画順(DrawObjStore が設定)
+        self._seq = 0
+        # 配置指定(設定されていれば x, y, sx, sy より優先)
+        self.layout: Optional[Box] = None
+        # このオブジェクトを親にしている配置指定
+        self._childLayouts: "WeakSet[Box]" = WeakSet()
+        # 描画位置を計算した時の (桁数, 行数, tsd.generation)
+        self._posKey: Optional[Tuple[int, int, int]] = None
+
+    def markDirty(self) -> None:
+        """
+        再描画が必要であることを通知
+        """
+        self._posKey = None
+        if not self._dirty:
+            self._dirty = True
+            if self._changeHook != None:
+                self._changeHook(self)
+        # このオブジェクトの矩形を親にしているものも動くかもしれない
+        # (描画されずに再描画待ちのままのオブジェクトが親でも伝える)
+        if self._childLayouts:
+            for box in list(self._childLayouts):
+                box._notify()
+
+    def isDirty(self) -> bool:
+        """
+        再描画が必要か
+        """
+        return self._dirty
+
+    def setStyle(self, style: int) -> None:
+        """
+        スタイル変更
+        """
+        if style != self.style:
+            self.style = style
+            self.markDirty()
 
     def renewal(self, x: ta_RePos = None, y: ta_RePos = None, sx: ta_RePos = None, sy: ta_RePos = None) -> None:
         """
         描画位置更新
         """
-        if x != None:
+        changed = False
+        if x != None and x != self.x:
             self.x = x
-        if y != None:
+            changed = True
+        if y != None and y != self.y:
             self.y = y
-        if sx != None:
+            changed = True
+        if sx != None and sx != self.sx:
             self.sx = sx
-        if sy != None:
+            changed = True
+        if sy != None and sy != self.sy:
             self.sy = sy
+            changed = True
+        if changed:
+            self.markDirty()
+
+    def setLayout(self, layout: Optional[Box]) -> None:
+        """
+        配置指定変更(None で x, y, sx, sy に戻す)
+
+        以後は layout.set() で指定を変えれば再描画される
+        """
+        if self.layout != None:
+            self.layout._owners.discard(self)
+        self.layout = layout
+        if layout != None:
+            layout._owners.add(self)
+        self.markDirty()
 
     def _getPosition(self, pos: ta_Pos, tsd: _tsDict) -> int:
         """
@@ -113,13 +400,31 @@ class Draw:
     def renewalPos(self, tsd: _tsDict) -> None:
         """
         描画位置更新
+
+        配置指定は Box が結果を保持する
+        x, y 等の関数は端末サイズが変わるか、このオブジェクトが変更を通知するまで呼び直さない
         """
+        if self.layout != None:
+            self.posX, self.posY, self.posSX, self.posSY = self.layout.resolve(tsd)
+            return
+        key = (tsd.column, tsd.line, tsd.generation)
+        if key == self._posKey:
+            return
+        self._posKey = key
         self.posX = self._getPosition(self.x, tsd)
         self.posSX = self._getPosition(self.sx, tsd)
         self.posY = self._getPosition(self.y, tsd)
         self.posSY = self._getPosition(self.sy, tsd)
 
-    def draw(self, tsd: _tsDict) -> None:
+    def getRect(self) -> ta_Rect:
+        """
+        描画範囲(x, y, sx, sy)取得
+
+        renewalPos() 後の値を返す
+        """
+        return (self.posX, self.posY, self.posSX, self.posSY)
+
+    def draw(self, tsd: _tsDict, fb: FrameBuffer) -> None:
         """
         描画
         """
@@ -131,31 +436,110 @@ class DrawSquare(Draw):
     矩形描画
     """
 
-    def draw(self, tsd: _tsDict) -> None:
+    def __init__(self, x: ta_Pos = 1, y: ta_Pos = 1, sx: ta_Pos = 0, sy: ta_Pos = 0) -> None:
+        super().__init__(x, y, sx, sy)
+        # 内側も空白で埋めるので下は見えない
+        self.opaque = True
+
+    def draw(self, tsd: _tsDict, fb: FrameBuffer) -> None:
         """
         描画
         """
-        super().draw(tsd)
+        super().draw(tsd, fb)
 
+        if self.posSX <= 0:
+            return
         maxY = self.posY + self.posSY
+        # 幅 1 なら左右の枠が重なる
+        middle = "#"+" "*(self.posSX-2)+"#" if self.posSX >= 2 else "#"
 
         for l in range(self.posY, maxY):
-            print(f"\033[{l};{self.posX}H", end="")
             if l == self.posY or l == maxY-1:
-                print("#"*self.posSX, end="")
+                fb.putText(self.posX, l, "#"*self.posSX, self.style)
             else:
-                print("#"+" "*(self.posSX-2)+"#", end="")
+                fb.putText(self.posX, l, middle, self.style)
 
 
 class DrawText(Draw):
     """
     文字描画
+
+    posSX より長い行は overflow の方法で矩形に収める
+        "truncate": 末尾を切る(ellipsis があれば末尾をそれにする)
+        "hard": 幅ごとに折り返す
+        "word": 空白の位置で折り返す
+        "none": 収めない(はみ出す)
+    折り返しや行数が posSY を超えた分は表示しない(posSX, posSY が 0 以下なら制限しない)
     """
 
+    OVERFLOW_MODES: Final[Tuple[str, ...]] = ("truncate", "hard", "word", "none")
+
     def __init__(self, x: ta_Pos = 0, y: ta_Pos = 0, sx: ta_Pos = 0, sy: ta_Pos = 0, text: str = "") -> None:
         super().__init__(x, y, sx, sy)
+        self._jpMode = 0
+        # 整形済みの行(posSX に合わせて中央寄せ済み)
+        self._lines: Optional[List[str]] = None
+        self._linesSX = 0
+        self._linesWidth = 0
+        # 行・セルの整形結果のキャッシュ(他のオブジェクトと共有)
+        self.lineCache: lc.LineCache = lc.shared
+        # はみ出す行の扱い
+        self.overflow = "truncate"
+        self.ellipsis = ""
+        self._linesSY = 0
+        # 整形した時と最後に位置を計算した時の tsd.generation
+        self._linesGen = 0
+        self._generation = 0
+        # 入力・表示文字列の本体
+        self.buffer = EditBuffer()
+        self._bufferVersion = self.buffer.version
         self.changeText(text)
-        self.jpMode = 0
+
+    @property
+    def jpMode(self) -> int:
+        """
+        日本語入力モード(0:なし, 1:ひらがな, 2:カタカナ)
+        """
+        return self._jpMode
+
+    @jpMode.setter
+    def jpMode(self, mode: int) -> None:
+        if mode != self._jpMode:
+            self._jpMode = mode
+            self._lines = None
+            self.markDirty()
+
+    @property
+    def control_text(self) -> str:
+        """
+        制御文字列(確定文字列 + "\\u0000" + 未確定文字列)
+        """
+        return self.buffer.controlText()
+
+    @control_text.setter
+    def control_text(self, text: str) -> None:
+        self._setControlText(text)
+
+    @property
+    def text(self) -> str:
+        return self.control_text.replace(r"\u0000", "")
+
+    def _setControlText(self, text: str) -> None:
+        """
+        文字更新(変更通知なし)
+        """
+        self.buffer.setControlText(text)
+        self._bufferVersion = self.buffer.version
+        self._lines = None
+
+    def textChanged(self) -> None:
+        """
+        buffer を直接編集した後の変更通知
+        """
+        if self.buffer.version != self._bufferVersion:
+            self._bufferVersion = self.buffer.version
+            self._lines = None
+            self.markDirty()
 
     def changeText(self, text: str) -> None:
         """
@@ -165,94 +549,430 @@ class DrawText(Draw):
         if text.count("\u0000") == 0:
             text = "\u0000" + text
 
-        self.control_text = text
-        self.text = text.replace(r"\u0000", "")
+        if text != self.control_text:
+            self._setControlText(text)
+            self.markDirty()
 
     def getText(self) -> str:
         """
         文字取得
         """
-        return jpReplace(self.control_text, self.jpMode)
+        return self.buffer.getText(self.jpMode)
 
-    def draw(self, tsd: _tsDict) -> None:
+    def setOverflow(self, overflow: str, ellipsis: str = "") -> None:
         """
-        描画
+        はみ出す行の扱い変更
+        """
+        if overflow not in DrawText.OVERFLOW_MODES:
+            raise ValueError(f"overflow は {DrawText.OVERFLOW_MODES} のいずれかです: {overflow!r}")
+        if overflow != self.overflow or ellipsis != self.ellipsis:
+            self.overflow = overflow
+            self.ellipsis = ellipsis
+            self._lines = None
+            self.markDirty()
+
+    def _fit(self, lines: List[str]) -> List[str]:
+        """
+        行を矩形(posSX, posSY)に収める
+        """
+        width = self.posSX
+        mode = self.overflow
+        if mode == "none":
+            return lines
+        if width > 0:
+            if mode == "truncate":
+                lines = [ewo.truncate(t, width, self.ellipsis) for t in lines]
+            else:
+                word = mode == "word"
+                fitted: List[str] = []
+                for t in lines:
+                    if ewo.slen(t) <= width:
+                        fitted.append(t)
+                    else:
+                        fitted.extend(ewo.wrap(t, width, word))
+                lines = fitted
+        if self.posSY > 0:
+            lines = lines[:self.posSY]
+        return lines
+
+    def _getLines(self) -> List[str]:
+        """
+        整形済みの行取得(変更が無ければ前回の結果を使う)
+        """
+        if self._lines is None or self._linesSX != self.posSX or self._linesSY != self.posSY or self._linesGen != self._generation:
+            spText = self._fit(self.getText().split("\n"))
+            fmt = self.lineCache.format
+            self._lines = [fmt(t, self.posSX) for t in spText]
+            self._linesSX = self.posSX
+            self._linesSY = self.posSY
+            self._linesGen = self._generation
+            self._linesWidth = -1
+        return self._lines
+
+    def renewalPos(self, tsd: _tsDict) -> None:
+        super().renewalPos(tsd)
+        # displayChange() 等の後は整形し直す(表示する値がその場で書き換えられているかもしれない)
+        self._generation = tsd.generation
+
+    def getRect(self) -> ta_Rect:
         """
-        super().draw(tsd)
+        描画範囲(x, y, sx, sy)取得
+        """
+        lines = self._getLines()
+        if self._linesWidth < 0:
+            self._linesWidth = maxStrLen(lines)
+        return (self.posX, self.posY, max(self.posSX, self._linesWidth), max(self.posSY, len(lines)))
 
-        spText = jpReplace(self.control_text, self.jpMode).split("\n")
+    def draw(self, tsd: _tsDict, fb: FrameBuffer) -> None:
+        """
+        描画
+        """
+        super().draw(tsd, fb)
 
-        i = 0
-        for l in range(self.posY, self.posY+max(self.posSY, len(spText))):
-            print(f"\033[{l};{self.posX}H", end="")
-            if i < len(spText):
-                print(ewo.center(spText[i], self.posSX), end="")
-                i += 1
+        lines = self._getLines()
+        i0, i1 = fb.visibleRows(self.posY, len(lines))
+        for i in range(i0, i1):
+            fb.putText(self.posX, self.posY+i, lines[i], self.style)
 
 
 class DrawTableText(DrawText):
     """
-    テーブル描画
+    テーブル描画
+
+    listText にはリストの他に RowSource(行範囲を取り出す関数・イテレータ等)を渡せる
+    表示範囲(posSY 行)の行だけを取り出して整形するので、
+    行数が多くてもスクロール・描画の時間とメモリは変わらない
+    並べ替え・絞り込みは IndexedRows の索引で行う(sortBy, filterBy)
     """
 
-    ewo_dict: Final[Dict[str, Callable[[str, int], str]]] = {
-        "c": ewo.center,
-        "l": ewo.ljust,
-        "r": ewo.rjust,
-    }
+    ewo_dict: Final[Dict[str, Callable[[str, int], str]]] = lc.ALIGN
 
-    def __init__(self, x: ta_Pos = 0, y: ta_Pos = 0, sx: ta_Pos = 0, sy: ta_Pos = 0, listText: ta_ListText = [], settingList: List[List[Union[int, str]]] = []) -> None:
+    def __init__(self, x: ta_Pos = 0, y: ta_Pos = 0, sx: ta_Pos = 0, sy: ta_Pos = 0, listText: ta_TableRows = [], settingList: List[List[Union[int, str]]] = []) -> None:
         super().__init__(x, y, sx, sy)
         self.listText = listText
+        self.source = toRowSource(listText)
+        self.source.subscribe(self._sourceChanged)
         self.settingList = settingList
         self.scroll = 0
+        # 整形済みテーブルの作成条件(scroll, posSY, posSX, tsd.generation)
+        self._tableKey: Optional[Tuple[int, int, int, int]] = None
+        # 表示範囲の行に列数が settingList と合わないものがあったか
+        self._columnMismatch = False
 
-    def changeListText(self, listText: ta_ListText) -> None:
+    def changeListText(self, listText: ta_TableRows) -> None:
         """
         文字リスト(csv)更新
+
+        同じリストを渡した場合は中身が書き換えられたものとして扱う
         """
-        self.listText = listText
+        if listText is not self.listText:
+            self._setSource(toRowSource(listText))
+            self.listText = listText
+        self._tableKey = None
+        self.markDirty()
+
+    def _setSource(self, source: RowSource) -> None:
+        """
+        行データ取得元の差し替え
+        """
+        self.source.unsubscribe(self._sourceChanged)
+        self.source = source
+        source.subscribe(self._sourceChanged)
+
+    def _sourceChanged(self) -> None:
+        """
+        行データ取得元からの変更通知
+        """
+        self._tableKey = None
+        self.markDirty()
+
+    def _indexedSource(self) -> IndexedRows:
+        """
+        索引付きの行データ取得
+
+        IndexedRows 以外なら変換し、以後は listText・source ともにそれを使う
+        (行の追加・更新・削除は source に対して行う)
+        イテレータ等の先読みする取得元は最後まで読んでから変換する
+        """
+        if not isinstance(self.source, IndexedRows):
+            source = self.source
+            if source.firstIndex() > 0:
+                raise ValueError("先頭の行が既に捨てられているので並べ替え・絞り込みできません(IteratorSource の keep を増やしてください)")
+            indexed = IndexedRows([row for rows in source.iterRows() for row in rows])
+            self._setSource(indexed)
+            self.listText = indexed
+            self._tableKey = None
+        return self.source
+
+    def sortBy(self, key: Optional[ta_SortKey] = None, reverse: bool = False) -> None:
+        """
+        並べ替え(key 省略で元の順)
+        """
+        self._indexedSource().setSort(key, reverse)
+
+    def filterBy(self, rowFilter: Optional[ta_RowFilter] = None) -> None:
+        """
+        絞り込み(省略で解除)
+        """
+        self._indexedSource().setFilter(rowFilter)
+
+    def _clampScroll(self, scroll: int) -> int:
+        """
+        スクロール位置を表示可能な範囲に収める
+        """
+        source = self.source
+        source.ensure(scroll + max(self.posSY, 0))
+        if self.posSY > 0:
+            scroll = min(scroll, max(len(source)-self.posSY, 0))
+        return max(scroll, source.firstIndex(), 0)
 
     def listScroll(self, num: int) -> int:
         """
         リストをスクロールさせる
         """
-        self.scroll += num
-        if self.scroll < 0:
-            self.scroll = 0
+        old = self.scroll
+        self.scroll = self._clampScroll(self.scroll + num)
+        if self.scroll != old:
+            self.markDirty()
         return self.scroll
 
-    def draw(self, tsd: _tsDict) -> None:
+    def _formatRow(self, row: Sequence[Any]) -> str:
+        """
+        1行整形
+        """
+        return formatRow(row, self.settingList, self.lineCache.format)
+
+    def export(self, out: Any, chunkSize: int = 5000, processes: Optional[int] = 1, header: Optional[Sequence[Any]] = None, ansi: bool = True, encoding: str = "utf-8") -> int:
+        """
+        全行を同じ列設定で整形してファイル等へ書き出す(書き出した行数を返す)
+
+        表示範囲に関係なく、取得元の全行を chunkSize 行ずつ書き出すのでメモリは一定
+        processes: 整形に使うプロセス数(1 ならこのプロセス, None なら CPU 数)
+        詳しくは tableExport.exportRows()
+        """
+        from tableExport import exportRows
+
+        return exportRows(self.source, self.settingList, out, chunkSize, processes, header, ansi, encoding)
+
+    def _getLines(self) -> List[str]:
+        """
+        表示範囲の行を整形(データ・スクロール位置が変わった時のみ)
+        """
+        self.scroll = self._clampScroll(self.scroll)
+        key = (self.scroll, self.posSY, self.posSX, self._generation)
+        if self._lines is None or self._tableKey != key:
+            rows = self.source.rows(self.scroll, self.scroll+max(self.posSY, 0))
+            columns = len(self.settingList)
+            self._columnMismatch = any(len(row) != columns for row in rows)
+            # 行は折り返さず、はみ出す分は切る
+            if self.overflow != "none" and self.posSX > 0:
+                self._lines = [ewo.center(ewo.truncate(self._formatRow(row), self.posSX, self.ellipsis), self.posSX) for row in rows]
+            else:
+                self._lines = [ewo.center(self._formatRow(row), self.posSX) for row in rows]
+            self._linesSX = self.posSX
+            self._linesSY = self.posSY
+            self._linesGen = self._generation
+            self._linesWidth = -1
+            self._tableKey = key
+        return self._lines
+
+    def draw(self, tsd: _tsDict, fb: FrameBuffer) -> None:
         """
         描画
         """
         self.renewalPos(tsd)
 
-        listTextLen = len(self.listText)
-
-        if listTextLen > 0:
-            if len(self.listText[0]) != len(self.settingList):
-                input("リスト長の不一致")
-                return
-        else:
+        if len(self.source) == 0:
+            return
+        self._getLines()
+        if self._columnMismatch:
+            # 描画を止めないように、入力を待たず表の位置に表示する
+            fb.putText(self.posX, self.posY, ewo.center(ewo.cut("リスト長の不一致", self.getRect()[2]), self.posSX), self.style)
             return
 
-        minLineSize = min(listTextLen, self.posSY)
+        super().draw(tsd, fb)
+
+
+class DrawLogText(Draw):
+    """
+    ログ表示(tail -f のように末尾に行を追加し続ける)
+
+    行は容量 capacity のリングバッファに持ち、古い行から捨てる
+    追加(append, extend)は別スレッドから呼べる
+    末尾追従中は端末側をスクロールさせるので、新しく来た行だけが出力される
+    """
+
+    def __init__(self, x: ta_Pos = 0, y: ta_Pos = 0, sx: ta_Pos = 0, sy: ta_Pos = 0, capacity: int = 10000, cacheWidth: bool = True) -> None:
+        """
+        capacity: 保持する最大行数
+        cacheWidth: 追加時に各行の表示幅を計算して持つか
+        """
+        super().__init__(x, y, sx, sy)
+        self.capacity = max(capacity, 1)
+        self._logLines: Deque[str] = deque(maxlen=self.capacity)
+        self._logWidths: Optional[Deque[int]] = deque(maxlen=self.capacity) if cacheWidth else None
+        # これまでに追加された行数(行の通し番号の終端)
+        self._total = 0
+        self._lock = Lock()
+        # 末尾追従中か(False の時は _top 行目から表示)
+        self.follow = True
+        self._top = 0
+        # 前回描画時の (x, y, sx, sy, 末尾の通し番号)
+        self._drawnTail: Optional[Tuple[int, int, int, int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._logLines)
+
+    def _firstIndex(self) -> int:
+        """
+        保持している最初の行の通し番号
+        """
+        return self._total - len(self._logLines)
+
+    def extend(self, lines: Iterable[str]) -> int:
+        """
+        複数行追加(改行を含む文字列は分割する)
 
-        if listTextLen-minLineSize <= self.scroll:
-            self.scroll = listTextLen-minLineSize
-        if listTextLen <= self.posSY:
-            self.scroll = 0
+        追加した行数を返す
+        """
+        new: List[str] = []
+        for line in lines:
+            new.extend(line.split("\n"))
+        if not new:
+            return 0
+        # 幅の計算はロックの外で行う
+        widths = ewo.slens(new) if self._logWidths is not None else None
+        with self._lock:
+            self._logLines.extend(new)
+            if self._logWidths is not None and widths is not None:
+                self._logWidths.extend(widths)
+            old = self._total
+            self._total += len(new)
+            # 遡って表示中なら、表示範囲に影響する時だけ描き直す
+            visible = self.follow or self._top < self._firstIndex() or old < self._top + self.posSY
+        if visible:
+            self.markDirty()
+        return len(new)
+
+    def append(self, line: str) -> int:
+        """
+        行追加
+        """
+        return self.extend((line,))
+
+    def clear(self) -> None:
+        """
+        全行削除
+        """
+        with self._lock:
+            self._logLines.clear()
+            if self._logWidths is not None:
+                self._logWidths.clear()
+            self._top = self._total
+        self.markDirty()
+
+    def _tailTop(self) -> int:
+        """
+        末尾追従時の先頭行の通し番号
+        """
+        return max(self._total - max(self.posSY, 0), self._firstIndex())
+
+    def scroll(self, num: int) -> int:
+        """
+        表示位置を num 行動かす(負で過去へ)
+
+        末尾まで戻ると追従を再開する
+        戻り値は末尾から何行遡っているか
+        """
+        with self._lock:
+            tail = self._tailTop()
+            top = (tail if self.follow else self._top) + num
+            top = max(min(top, tail), self._firstIndex())
+            follow = top >= tail
+            changed = follow != self.follow or (not follow and top != self._top)
+            self.follow = follow
+            self._top = top
+        if changed:
+            self.markDirty()
+        return tail - top
+
+    def followTail(self) -> None:
+        """
+        末尾追従に戻す
+        """
+        if not self.follow:
+            self.follow = True
+            self.markDirty()
+
+    def _window(self) -> Tuple[int, List[str], Optional[List[int]]]:
+        """
+        表示範囲の (末尾の通し番号, 行, 幅)
+        """
+        n = max(self.posSY, 0)
+        with self._lock:
+            lines = self._logLines
+            widths = self._logWidths
+            if self.follow:
+                k = min(n, len(lines))
+                view = list(islice(reversed(lines), k))[::-1]
+                viewWidths = list(islice(reversed(widths), k))[::-1] if widths is not None else None
+                return self._total, view, viewWidths
+            first = self._firstIndex()
+            self._top = max(self._top, first)
+            i0 = self._top - first
+            i1 = min(i0 + n, len(lines))
+            view = [lines[i] for i in range(i0, i1)]
+            viewWidths = [widths[i] for i in range(i0, i1)] if widths is not None else None
+            return self._top + len(view), view, viewWidths
+
+    def getRect(self) -> ta_Rect:
+        return (self.posX, self.posY, self.posSX, self.posSY)
+
+    def draw(self, tsd: _tsDict, fb: FrameBuffer) -> None:
+        """
+        描画
+        """
+        super().draw(tsd, fb)
+
+        tail, lines, widths = self._window()
+        if widths is None:
+            widths = ewo.slens(lines)
+        rect = (self.posX, self.posY, self.posSX, self.posSY)
+
+        # 前回から全幅のまま行が増えただけなら、端末側のスクロールで済ませる
+        drawn = self._drawnTail
+        if self.follow and drawn != None and drawn[:4] == rect and len(lines) == self.posSY:
+            if self.posX <= 1 and self.posX + self.posSX - 1 >= fb.column and fb.visibleRows(self.posY, self.posSY) == (0, self.posSY):
+                delta = tail - drawn[4]
+                if 0 < delta < self.posSY:
+                    fb.scrollUp(self.posY, self.posY+self.posSY-1, delta)
+        self._drawnTail = rect + (tail,) if self.follow else None
+
+        i0, i1 = fb.visibleRows(self.posY, len(lines))
+        sx = self.posSX
+        for i in range(i0, i1):
+            line = lines[i]
+            fb.putText(self.posX, self.posY+i, line if widths[i] <= sx else ewo.cut(line, sx), self.style)
+
+
+class Timer:
+    """
+    DrawObjStore.schedule() で予約した処理
+    """
 
-        tmpText = ""
-        for i in range(self.scroll, self.scroll+minLineSize):
-            for j in range(len(self.settingList)):
-                tmpText += DrawTableText.ewo_dict[str(self.settingList[j][1])](
-                    str(self.listText[i][j]), int(self.settingList[j][0])) + " "
-            tmpText += "\n"
-        self.changeText(tmpText[:-1])
+    def __init__(self, when: float, func: Callable[[], Any], interval: Optional[float] = None) -> None:
+        # 実行する時刻(monotonic)
+        self.when = when
+        self.func = func
+        # 繰り返す間隔(None なら1回だけ)
+        self.interval = interval
+        self.cancelled = False
 
-        super().draw(tsd)
+    def cancel(self) -> None:
+        """
+        予約取り消し
+        """
+        self.cancelled = True
 
 
 class DrawObjStore:
@@ -260,18 +980,74 @@ class DrawObjStore:
     描画オブジェクト管理
     """
 
-    def __init__(self, keyDict: ta_keyDict) -> None:
+    def __init__(self, keyDict: ta_keyDict, backend: Optional[Backend] = None) -> None:
         """
         キー配列設定
+
+        backend: 出力先(省略時は標準出力, VirtualScreen を渡せば TTY 無しで描画できる)
         """
         self.store: list[list[ta_Draw]] = []
         self.overLayerStore: list[bool] = []
         self.layerLen: int = 0
+        self.backend: Backend = backend if backend != None else StdoutBackend()
         self.tsd = _tsDict()
+        self.tsd.sizeFunc = self.backend.size
         self.oldTsd = _tsDict()
+        # リサイズが落ち着くまで待つ秒数
+        self.resizeDebounce: float = 0.05
         self.keyDict = keyDict
+        # 全体を描き直す必要があるか
         self._isObjChange: bool = False
         self.sleepTime = 1
+        self.frameBuffer = FrameBuffer()
+        # 再描画待ちのオブジェクト(挿入順を保つため dict を集合として使う)
+        self._dirtyObjs: Dict[Draw, None] = {}
+        # 削除されたオブジェクト等で描き直しが必要な矩形
+        self._damage: List[ta_Rect] = []
+        # 描画内容が変わった時の通知先(描画ループ等が設定)
+        self.changeHook: Optional[Callable[[], None]] = None
+        # 別スレッドからの変更通知と描画の間で _dirtyObjs を守る
+        self._dirtyLock = Lock()
+        # フレームの計測(FrameProfiler.attach() で設定, None なら計測しない)
+        self.profiler: Optional["FrameProfiler"] = None
+        # 前回描画した矩形(画面内に収めたもの)の索引
+        self.spatial: SpatialIndex[Draw] = SpatialIndex()
+        self._seq = 0
+        # 全レイヤーの上に重ねる一時的なレイヤー(ポップアップ等, addObj() の対象にならない)
+        self.overlays: List[List[ta_Draw]] = []
+        # 予約した処理の (時刻, 通し番号, Timer) のヒープ
+        self._timers: List[Tuple[float, int, Timer]] = []
+        self._timerSeq = 0
+        self._timerLock = Lock()
+        _ResizeSignal.register(self)
+
+    def _notifyChange(self) -> None:
+        """
+        描画内容の変更を通知
+        """
+        if self.changeHook != None:
+            self.changeHook()
+
+    def _objChanged(self, obj: Draw) -> None:
+        """
+        描画オブジェクトからの変更通知(別スレッドからも呼ばれる)
+        """
+        with self._dirtyLock:
+            self._dirtyObjs[obj] = None
+        self._notifyChange()
+
+    def _takeDirty(self) -> List[Draw]:
+        """
+        再描画待ちのオブジェクトを取り出す
+
+        描画前に再描画フラグを下ろすので、描画中に来た変更は次のフレームに回る
+        """
+        with self._dirtyLock:
+            objs = list(self._dirtyObjs)
+            self._dirtyObjs.clear()
+            for d in objs:
+                d._dirty = False
+        return objs
 
     def addLayer(self, useFullScreen: bool = False) -> int:
         """
@@ -280,6 +1056,9 @@ class DrawObjStore:
         self.store.append([])
         self.overLayerStore.append(useFullScreen)
         self.layerLen = len(self.store)
+        if useFullScreen:
+            self._isObjChange = True
+            self._notifyChange()
         return self.layerLen
 
     def removeLayer(self, ind: Optional[int] = None) -> int:
@@ -288,21 +1067,138 @@ class DrawObjStore:
         """
         if ind == None:
             ind = -1
-        self.store.pop(ind)
-        self.overLayerStore.pop(ind)
+        layer = self.store.pop(ind)
+        if self.overLayerStore.pop(ind):
+            self._isObjChange = True
+        self._detachLayer(layer)
         self.layerLen = len(self.store)
-        self._isObjChange = True
+        self._notifyChange()
         return self.layerLen
 
+    def _detachLayer(self, layer: List[ta_Draw]) -> None:
+        """
+        外したレイヤーのオブジェクトの後始末(表示されていた所は描き直す)
+        """
+        for d in layer:
+            if d._lastRect != None:
+                self._damage.append(d._lastRect)
+            d._changeHook = None
+            d._layerRef = None
+            self._dirtyObjs.pop(d, None)
+            self.spatial.remove(d)
+
+    def _attach(self, obj: ta_Draw, layer: List[ta_Draw]) -> None:
+        """
+        オブジェクトをレイヤーに入れて変更通知を受け取る
+        """
+        layer.append(obj)
+        obj._layerRef = layer
+        obj._seq = self._seq
+        self._seq += 1
+        obj._changeHook = self._objChanged
+        obj._dirty = True
+        self._dirtyObjs[obj] = None
+
+    def addOverlay(self, objs: Iterable[ta_Draw], sec: Optional[float] = None) -> List[ta_Draw]:
+        """
+        全レイヤーの上に一時的なレイヤーを重ねる
+
+        sec: 指定すると sec 秒後に自動で外す
+        戻り値のレイヤーを removeOverlay() に渡せば、それより前に外せる
+        """
+        layer: List[ta_Draw] = []
+        for d in objs:
+            self._attach(d, layer)
+        self.overlays.append(layer)
+        self._notifyChange()
+        if sec != None:
+            self.schedule(sec, lambda: self.removeOverlay(layer))
+        return layer
+
+    def removeOverlay(self, layer: List[ta_Draw]) -> None:
+        """
+        重ねたレイヤーを外す(外し済みなら何もしない)
+        """
+        for i, l in enumerate(self.overlays):
+            if l is layer:
+                del self.overlays[i]
+                self._detachLayer(layer)
+                self._notifyChange()
+                return
+
+    def _removeLayerRef(self, layer: List[ta_Draw]) -> None:
+        """
+        レイヤーをオブジェクトの同一性で探して削除(削除済みなら何もしない)
+        """
+        for i, l in enumerate(self.store):
+            if l is layer:
+                self.removeLayer(i)
+                return
+
+    # 予約処理
+
+    def schedule(self, delay: float, func: Callable[[], Any], interval: Optional[float] = None) -> Timer:
+        """
+        delay 秒後に func を実行する予約(interval を指定するとその間隔で繰り返す)
+
+        予約した処理は描画の直前(renderFrame() の中)で実行するので、
+        func の中での変更はそのフレームに入る(別スレッドからも呼べる)
+        点滅・スピナー・時計等は interval を指定して1回登録すればよい
+        """
+        timer = Timer(monotonic() + max(delay, 0), func, interval)
+        with self._timerLock:
+            heapq.heappush(self._timers, (timer.when, self._timerSeq, timer))
+            self._timerSeq += 1
+        self._notifyChange()
+        return timer
+
+    def timerWait(self) -> Optional[float]:
+        """
+        次の予約処理までの秒数(予約が無ければ None)
+        """
+        with self._timerLock:
+            timers = self._timers
+            while timers and timers[0][2].cancelled:
+                heapq.heappop(timers)
+            if not timers:
+                return None
+            return max(timers[0][0] - monotonic(), 0.0)
+
+    def runTimers(self) -> int:
+        """
+        時刻になった予約処理を実行(実行した数を返す)
+        """
+        now = monotonic()
+        count = 0
+        while True:
+            with self._timerLock:
+                timers = self._timers
+                if not timers or timers[0][0] > now:
+                    break
+                _, _, timer = heapq.heappop(timers)
+                if timer.cancelled:
+                    continue
+                if timer.interval != None:
+                    # 遅れた分は詰めずに次の時刻へ
+                    timer.when += timer.interval
+                    if timer.when <= now:
+                        timer.when = now + timer.interval
+                    heapq.heappush(timers, (timer.when, self._timerSeq, timer))
+                    self._timerSeq += 1
+            count += 1
+            timer.func()
+        return count
+
     def addObj(self, obj: ta_Draw, layerInd: Optional[int] = None) -> int:
         """
         描画オブジェクト追加
         """
         if layerInd == None:
             layerInd = self.layerLen
-        self.store[layerInd-1].append(obj)
-        self._isObjChange = True
-        return len(self.store[layerInd-1])
+        layer = self.store[layerInd-1]
+        self._attach(obj, layer)
+        self._notifyChange()
+        return len(layer)
 
     def getObj(self, objInd: Optional[int] = None, layerInd: Optional[int] = None) -> ta_Draw:
         """
@@ -314,94 +1210,311 @@ class DrawObjStore:
             objInd = -1
         return self.store[layerInd-1][objInd]
 
+    def _visibleLayers(self) -> Dict[int, int]:
+        """
+        表示されているレイヤーの id → レイヤー番号
+        """
+        olsInd = 1 + cf.listFind(list(reversed(self.overLayerStore)), True)
+        layers = self.store[-olsInd:]
+        base = len(self.store) - len(layers) + 1
+        return {id(l): li for li, l in enumerate(layers + self.overlays, base)}
+
+    def objectAt(self, x: int, y: int) -> Optional[ta_Draw]:
+        """
+        画面の (x, y) に表示されている一番上のオブジェクト(マウス操作の振り分け等)
+
+        前回描画した位置で判定する
+        """
+        layerNo = self._visibleLayers()
+        hits = [d for d in self.spatial.at(x, y) if id(d._layerRef) in layerNo]
+        if not hits:
+            return None
+        return max(hits, key=lambda d: (layerNo[id(d._layerRef)], d._seq))
+
+    def objectsIn(self, x: int, y: int, sx: int, sy: int) -> List[ta_Draw]:
+        """
+        矩形と重なる表示中のオブジェクト(描画順)
+        """
+        layerNo = self._visibleLayers()
+        hits = [d for d in self.spatial.query((x, y, sx, sy)) if id(d._layerRef) in layerNo]
+        hits.sort(key=lambda d: (layerNo[id(d._layerRef)], d._seq))
+        return hits
+
+    def _setRect(self, d: Draw) -> None:
+        """
+        描画した矩形を記録
+        """
+        r = d._lastRect = d.getRect()
+        # 画面外は当たり判定に使わないので画面内に収める
+        x0 = max(r[0], 1)
+        y0 = max(r[1], 1)
+        x1 = min(r[0]+r[2], self.tsd.column+1)
+        y1 = min(r[1]+r[3], self.tsd.line+1)
+        self.spatial.update(d, (x0, y0, x1-x0, y1-y0))
+
     def addStrObj(self, keyStr: str, allowKeyRegex: str = " -~", maxLen: int = 0, jpChange: bool = False, objInd: Optional[int] = None, layerInd: Optional[int] = None) -> Union[int, str]:
         """
         キー入力(リアルタイム)
         """
         tdTextObj = self.getObj(objInd=objInd, layerInd=layerInd)
         if isinstance(tdTextObj, DrawText):
-            textData = [*tdTextObj.control_text]
+            buf = tdTextObj.buffer
+            jpMode = tdTextObj.jpMode
             if keyStr == self.keyDict["ENTER"]:
-                if len(textData) > 1:
+                if not buf.isEmpty():
                     return tdTextObj.getText()
             elif keyStr == self.keyDict["BACKSPACE"]:
-                if len(textData) > 1:
-                    if textData[-1] == "\u0000":
-                        textData.pop(-2)
-                    elif len(textData) > 1:
-                        textData.pop()
+                buf.backspace()
             elif keyStr == self.keyDict["DELETE"]:
-                textData = ["\u0000"]
+                buf.clear()
             elif keyStr == self.keyDict["TAB"]:
                 if jpChange:
-                    textData = [*jpReplace(s_join(textData), tdTextObj.jpMode)]
-
-                    textData.append("\u0000")
-                    tdTextObj.jpMode = (tdTextObj.jpMode+1) % 3
+                    buf.commit(jpMode)
+                    tdTextObj.jpMode = (jpMode+1) % 3
+            elif keyStr == self.keyDict.get("LEFT"):
+                buf.moveCursor(-1, jpMode)
+            elif keyStr == self.keyDict.get("RIGHT"):
+                buf.moveCursor(1, jpMode)
             elif search(f"^[{allowKeyRegex}]$", keyStr):
-                if ewo.slen(jpReplace(s_join(textData), tdTextObj.jpMode)) < maxLen or maxLen == 0:
-                    textData.append(keyStr)
-            if s_join(textData) != tdTextObj.control_text:
-                self._isObjChange = True
-                tdTextObj.changeText(s_join(textData))
+                buf.insert(keyStr, jpMode, maxLen)
+            tdTextObj.textChanged()
             return 0
         return 1
 
-    def popupDraw(self, text: str = "", *, sec: Optional[int] = None, waitFunc: Optional[Callable] = None, layerRemove: bool = False) -> None:
-        """
-        ポップアップ表示
+    def pasteStrObj(self, text: str, allowKeyRegex: str = " -~", maxLen: int = 0, objInd: Optional[int] = None, layerInd: Optional[int] = None) -> int:
         """
+        まとまった文字列の入力(貼り付け等)
 
-        waitFlag = 0
+        許可されない文字は除き、1回の変更(再描画)で反映する
+        """
+        tdTextObj = self.getObj(objInd=objInd, layerInd=layerInd)
+        if isinstance(tdTextObj, DrawText):
+            text = s_join(_allowPattern(allowKeyRegex).findall(text))
+            tdTextObj.buffer.insert(text, tdTextObj.jpMode, maxLen)
+            tdTextObj.textChanged()
+            return 0
+        return 1
 
-        if sec == None:
-            sec = self.sleepTime
-        else:
-            waitFlag += 1
+    def popupDraw(self, text: str = "", *, sec: Optional[float] = None, waitFunc: Optional[Callable] = None, layerRemove: bool = False) -> List[ta_Draw]:
+        """
+        ポップアップ表示
 
+        待たずに戻り、sec 秒(省略時は sleepTime 秒)後に自動で消える
+        waitFunc を指定するとそれが戻った時に消す(sec も指定すればさらに sec 秒後)
+        layerRemove: 消す時に、表示した時点の一番上のレイヤーも削除する
+        戻り値は removeOverlay() で先に消す時に使う
+        """
         spText = text.split("\n")
         strLen = maxStrLen(spText)
-        self.addLayer()
-        self.addObj(DrawSquare(lambda ts: int(ts.column/2)-int(strLen/2)-3,
-                    lambda ts: int(ts.line/2)-int(len(spText)/2)-2, strLen+6, 4+len(spText)))
-        self.addObj(DrawText(lambda ts: int(ts.column/2)-int(strLen/2)-2,
-                    lambda ts: int(ts.line/2)-int(len(spText)/2), strLen+4, text=text))
+        square = DrawSquare()
+        square.setLayout(Box(left=-1, top=-1, width=strLen+6, height=4+len(spText), centerX=True, centerY=True))
+        body = DrawText(text=text)
+        body.setLayout(Box(left=1, top=2, width=strLen+4, height=0, parent=square.layout))
+        layer = self.addOverlay([square, body])
+        below = self.store[-1] if layerRemove and self.store else None
         self.drawTerminal()
-        self.removeLayer()
+
+        def close() -> None:
+            self.removeOverlay(layer)
+            if below != None:
+                self._removeLayerRef(below)
 
         if waitFunc != None:
-            waitFlag += 2
             waitFunc()
+            if sec == None:
+                close()
+                return layer
+        self.schedule(self.sleepTime if sec == None else sec, close)
+        return layer
 
-        if waitFlag == 0 or waitFlag & 1:
-            sleep(sec)
-        if layerRemove:
-            self.removeLayer()
+    def toast(self, text: str, sec: Optional[float] = None, style: int = 0) -> List[ta_Draw]:
+        """
+        右下に短い通知を表示(sec 秒, 省略時は sleepTime 秒後に自動で消える)
+        """
+        spText = text.split("\n")
+        toast = DrawText(text=text)
+        toast.setLayout(Box(right=1, bottom=1, width=maxStrLen(spText)+2, height=len(spText)))
+        toast.setStyle(style)
+        return self.addOverlay([toast], self.sleepTime if sec == None else sec)
 
     def displayChange(self) -> None:
         """
-        描画オブジェクト変更
+        描画オブジェクト変更(全体を描き直す)
+
+        changeText() 等を通した変更は各オブジェクトが通知するので不要
         """
         self._isObjChange = True
+        # 位置の関数・表示する値が変わったかもしれないので計算・整形し直す
+        self.tsd.generation += 1
+        self._notifyChange()
+
+    def _write(self, s: str) -> None:
+        """
+        出力先へ一括書き込み
+        """
+        self.backend.write(s)
 
     def drawTerminal(self, obligation: bool = False) -> None:
         """
         描画処理実行
+
+        全オブジェクトをフレームバッファに描画し、
+        前フレームとの差分だけを1回の書き込みで出力する
         """
-        self.tsd.renewal()
+        out = self.renderFrame(obligation)
+        if out:
+            self._write(out)
+
+    def renderFrame(self, obligation: bool = False) -> str:
+        """
+        1フレーム分の出力文字列を作成(書き込みはしない)
+
+        変更が無ければ空文字列を返す
+        """
+        fb = self.frameBuffer
+        prof = self.profiler
+        if prof != None:
+            prof.begin()
+        prefix = ""
+        self.runTimers()
+        if obligation:
+            # 全体再描画では位置・整形済みの行も作り直す
+            self.tsd.generation += 1
+        self.tsd.renewal(self.resizeDebounce)
         if self.oldTsd.column != self.tsd.column or self.oldTsd.line != self.tsd.line:
             obligation = True
-            self.oldTsd.renewal()
-            system("cls")
+            if prof != None:
+                prof.markResize()
+            self.oldTsd.column = self.tsd.column
+            self.oldTsd.line = self.tsd.line
+            # 画面消去はサブプロセスを使わずエスケープシーケンスで行う
+            prefix = "\033[0m\033[2J"
+            fb.resize(self.tsd.column, self.tsd.line)
+        elif obligation:
+            fb.invalidate()
+
+        olsInd = 1 + cf.listFind(list(reversed(self.overLayerStore)), True)
+        layers = self.store[-olsInd:] + self.overlays
+        # layers[0] のレイヤー番号
+        base = len(self.store) - len(layers) + len(self.overlays) + 1
+
         if self._isObjChange or obligation:
             self._isObjChange = False
 
-            olsInd = 1 + cf.listFind(list(reversed(self.overLayerStore)), True)
+            self._takeDirty()
+            self._damage.clear()
+            fb.clear()
+            order = [(li, d) for li, l in enumerate(layers, base) for d in l]
+            for _, d in order:
+                d._dirty = False
+                d.renewalPos(self.tsd)
+                self._setRect(d)
+            for (li, d), rows in zip(order, self._visibility(order)):
+                if rows != None:
+                    self._drawObj(d, li, rows)
+            if prof != None:
+                prof.markFull()
+        elif self._dirtyObjs or self._damage:
+            self._drawDamage(layers, base)
+        else:
+            if prof != None:
+                prof.cancel()
+            return ""
+
+        out = fb.render()
+        if out or prefix:
+            out = prefix + out + "\033[1;1H"
+        if prof != None:
+            prof.end(out, sum(map(len, layers)))
+        return out
+
+    def resizeWait(self) -> float:
+        """
+        保留中のリサイズを反映できるまでの残り秒数(保留が無ければ 0)
+        """
+        return self.tsd.staleWait(self.resizeDebounce)
+
+    def hasChange(self) -> bool:
+        """
+        次のフレームで描き直すものがあるか
+        """
+        if self._isObjChange or self._dirtyObjs or self._damage:
+            return True
+        wait = self.timerWait()
+        return wait != None and wait <= 0
 
-            for l in self.store[-olsInd:]:
-                for d in l:
-                    d.draw(self.tsd)
-            print("\n\033[1;1H", end="")
+    def _visibility(self, order: List[Tuple[int, ta_Draw]]) -> List[Optional[Tuple[int, int]]]:
+        """
+        描画順の各オブジェクトについて、後から描かれる不透明なオブジェクトに隠れていない行の範囲
+        """
+        fb = self.frameBuffer
+        occluders: List[ta_Rect] = []
+        result: List[Optional[Tuple[int, int]]] = [None]*len(order)
+        for i in range(len(order)-1, -1, -1):
+            d = order[i][1]
+            r = d._lastRect
+            if r == None:
+                result[i] = (1, fb.line)
+                continue
+            result[i] = _visibleRows(r, occluders, fb.column, fb.line)
+            if d.opaque and r[2] > 0 and r[3] > 0:
+                occluders.append(r)
+        return result
+
+    def _drawObj(self, d: ta_Draw, layer: int, rows: Tuple[int, int]) -> None:
+        """
+        rows の行範囲に制限して描画
+        """
+        fb = self.frameBuffer
+        clip = fb.clip
+        y0, y1 = rows
+        if clip != None:
+            y0 = max(y0, clip[0])
+            y1 = min(y1, clip[1])
+        if y0 > y1:
+            return
+        fb.setClipRows(y0, y1)
+        if self.profiler is None:
+            d.draw(self.tsd, fb)
+        else:
+            self.profiler.timeDraw(d, layer, self.tsd, fb)
+        if clip is None:
+            fb.setClipRows()
+        else:
+            fb.setClipRows(*clip)
+
+    def _drawDamage(self, layers: List[List[ta_Draw]], base: int = 1) -> None:
+        """
+        変更されたオブジェクトに関わる行だけを描き直す
+        """
+        fb = self.frameBuffer
+        visible = {id(l) for l in layers}
+        damage = self._damage
+        self._damage = []
+
+        for d in self._takeDirty():
+            if id(d._layerRef) not in visible:
+                # 表示されていないレイヤーの変更は、表示された時に描き直す
+                d._dirty = True
+                continue
+            if d._lastRect != None:
+                damage.append(d._lastRect)
+            d.renewalPos(self.tsd)
+            self._setRect(d)
+            damage.append(d._lastRect)
+
+        layerNo = {id(l): li for li, l in enumerate(layers, base)}
+        for y0, y1 in _mergeRows(damage, fb.line):
+            fb.setClipRows(y0, y1)
+            fb.clearRows(y0, y1)
+            # 描き直す行に掛かるオブジェクトだけを索引から取り出す
+            hits = [d for d in self.spatial.query((1, y0, fb.column, y1-y0+1)) if id(d._layerRef) in layerNo]
+            hits.sort(key=lambda d: (layerNo[id(d._layerRef)], d._seq))
+            order = [(layerNo[id(d._layerRef)], d) for d in hits]
+            for (li, d), rows in zip(order, self._visibility(order)):
+                if rows != None:
+                    self._drawObj(d, li, rows)
+        fb.setClipRows()
 
 
 @dataclass
@@ -437,3 +1550,15 @@ class W_Color:
     @classmethod
     def __getitem__(cls, key: str) -> str:
         return vars(cls)[key]
+
+    @classmethod
+    def style(cls, *keys: str) -> int:
+        """
+        名前を組み合わせたスタイル(cellStyle の整数)
+
+        W_Color.style("BOLD", "RED") のように使い、Draw.setStyle() 等に渡す
+        """
+        style = 0
+        for key in keys:
+            style = applySgr(style, vars(cls)[key][2:-1])
+        return style